@@ -0,0 +1,77 @@
+"""
+Micro-benchmark of the blocked kernels ratio_tanh_x and logcosh.
+The previous whole-array implementations are compared with the blocked ones,
+with and without a preallocated out buffer, on the sizes of the HSMM working buffers (n*K*M).
+
+Usage (in this directory):
+    python elementary_function.py [size]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+import time
+import tracemalloc
+
+## 3rd party libraries
+import numpy as np
+
+## local libraries
+from util import ratio_tanh_x, logcosh
+
+
+def ratio_tanh_x_reference(x:np.ndarray):
+    """
+    Previous implementation of ratio_tanh_x with masks and temporaries of the size of x.
+    """
+    zero_condition = 1e-20
+    ret_val = np.zeros(x.shape)
+    zero_ind = np.abs(x) < zero_condition
+    ret_val[~zero_ind] = np.tanh(x[~zero_ind]) / x[~zero_ind]
+    ret_val[zero_ind] = 1
+    return ret_val
+
+
+def logcosh_reference(x:np.ndarray):
+    """
+    Previous implementation of logcosh.
+    """
+    return np.abs(x) + np.log((1 + np.exp(-2 * np.abs(x)))/2)
+
+
+def measure(func, repeat:int):
+    """
+    Return mean wall time [ms] and peak memory [MB] traced during func().
+    """
+    func()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat * 1e3
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return (elapsed, peak)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    repeat = 10
+
+    rng = np.random.default_rng(1)
+    x = np.abs(rng.normal(scale = 5, size = size))
+    ### Zero point and large values are included to check the numerical safety.
+    x[:3] = [0, 1e-30, 1e3]
+    out = np.empty_like(x)
+
+    assert np.allclose(ratio_tanh_x(x), ratio_tanh_x_reference(x), rtol = 1e-14, atol = 0)
+    assert np.allclose(logcosh(x), logcosh_reference(x), rtol = 1e-14, atol = 1e-15)
+
+    print(f"size={size}, {repeat} repeats")
+    print("%-36s %10s %10s" % ("kernel", "time[ms]", "peak[MB]"))
+    for (name, func) in [("ratio_tanh_x/reference", lambda: ratio_tanh_x_reference(x)),
+                         ("ratio_tanh_x/blocked", lambda: ratio_tanh_x(x)),
+                         ("ratio_tanh_x/blocked, out", lambda: ratio_tanh_x(x, out = out)),
+                         ("logcosh/reference", lambda: logcosh_reference(x)),
+                         ("logcosh/blocked", lambda: logcosh(x)),
+                         ("logcosh/blocked, out", lambda: logcosh(x, out = out))]:
+        print("%-36s %10.2f %10.2f" % ((name,) + measure(func, repeat)))
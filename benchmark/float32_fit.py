@@ -0,0 +1,68 @@
+"""
+Benchmark of dtype=np.float32 of the VB mixture estimators.
+Wall time, final energy and clustering accuracy are compared with float64,
+and the differences are checked against the bounds below.
+The dtype of the latent variables of result_ is also checked for each execution mode of fit.
+
+Usage (in this directory):
+    python float32_fit.py [n] [K] [M]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+sys.path.append("../hypsecant_related")
+import time
+
+## 3rd party libraries
+import numpy as np
+
+## local libraries
+from learning import GaussianMixtureModelVB
+from HyperbolicSecantMixtureModelVB import HyperbolicSecantMixtureVB
+
+### Bounds of the relative difference of the energy and the difference of the accuracy.
+ENERGY_RTOL = 1e-4
+ACCURACY_ATOL = 0.01
+
+### Execution modes of fit, each of which has to keep the latent variables in dtype.
+EXECUTION_MODES = [dict(), dict(n_jobs = 1), dict(batch_restarts = True), dict(acceleration = "squarem")]
+LATENT_KEYS = ["h_xi", "u_xi", "g_eta", "v_eta"]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    K = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    M = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    iteration = 50
+
+    rng = np.random.default_rng(1)
+    true_m = rng.normal(scale = 4, size = (K, M))
+    true_label_arg = rng.integers(K, size = n)
+    train_X = true_m[true_label_arg] + rng.normal(size = (n, M))
+
+    print(f"n={n}, K={K}, M={M}, {iteration} iterations")
+    print("%-36s %10s %16s %10s" % ("estimator", "time[s]", "energy", "accuracy"))
+    for cls in [HyperbolicSecantMixtureVB, GaussianMixtureModelVB]:
+        scores = dict()
+        for dtype in [np.float64, np.float32]:
+            ### tol < 0 lets the iteration run until the end.
+            estimator = cls(K = K, iteration = iteration, restart_num = 1, learning_seed = 1, tol = -1, step = 1, dtype = dtype)
+            start = time.perf_counter()
+            estimator.fit(train_X)
+            elapsed = time.perf_counter() - start
+            energy = estimator.result_["energy"][-1]
+            accuracy = estimator.score_clustering(true_label_arg)[0] / n
+            scores[dtype] = (energy, accuracy)
+            print("%-36s %10.3f %16.6f %10.4f" % (cls.__name__ + "/" + dtype.__name__, elapsed, energy, accuracy))
+        energy_diff = np.abs(scores[np.float32][0] - scores[np.float64][0]) / np.abs(scores[np.float64][0])
+        accuracy_diff = np.abs(scores[np.float32][1] - scores[np.float64][1])
+        print(f"relative energy difference {energy_diff:.2e} (bound {ENERGY_RTOL}), accuracy difference {accuracy_diff:.4f} (bound {ACCURACY_ATOL})")
+        assert energy_diff < ENERGY_RTOL and accuracy_diff < ACCURACY_ATOL
+
+    for cls in [HyperbolicSecantMixtureVB, GaussianMixtureModelVB]:
+        for mode in EXECUTION_MODES:
+            estimator = cls(K = K, iteration = 10, restart_num = 2, learning_seed = 1, step = 1, dtype = np.float32, **mode)
+            estimator.fit(train_X[:1000])
+            dtypes = {key: estimator.result_[key].dtype for key in LATENT_KEYS if key in estimator.result_}
+            print(cls.__name__, mode, dtypes)
+            assert all(dtype == np.float32 for dtype in dtypes.values())
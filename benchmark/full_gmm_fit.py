@@ -0,0 +1,77 @@
+"""
+Benchmark of the batched full-covariance path of GaussianMixtureModelVB.
+One iteration of the previous per-component implementation is compared with the batched one,
+the latent variables h_xi after the first iteration are checked to coincide.
+
+Usage (in this directory):
+    python full_gmm_fit.py [n] [K] [M]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+import time
+
+## 3rd party libraries
+import numpy as np
+from scipy.special import psi
+
+## local libraries
+from learning import GaussianMixtureModelVB
+from util import multipsi
+
+
+def full_step_reference(estimator:GaussianMixtureModelVB, train_X:np.ndarray, est_u_xi:np.ndarray):
+    """
+    Previous implementation of one iteration with a Python loop over the components, which returns h_xi.
+    """
+    (n, M) = train_X.shape
+    K = est_u_xi.shape[1]
+    pri_inv_Sigma = 1 / estimator.pri_delta * np.eye(M)
+    est_alpha = estimator.pri_alpha + est_u_xi.sum(axis=0)
+    est_beta = estimator.pri_beta + est_u_xi.sum(axis=0)
+    est_m = est_u_xi.T @ train_X / np.repeat(est_beta, M).reshape(K, M)
+    est_gamma = estimator.pri_gamma + est_u_xi.sum(axis=0)
+    est_delta = np.array([(np.repeat(est_u_xi[:, k], M).reshape(n, M) * train_X).T @ train_X - est_m[k, :].reshape(
+        M, 1) @ est_m[k, :].reshape(1, M) * est_beta[k] + pri_inv_Sigma for k in range(K)]).reshape(K, M, M).transpose((1, 2, 0))
+    est_h_xi = np.zeros((n, K))
+    for k in range(K):
+        est_g_eta = (train_X - est_m[k, :]) * np.linalg.solve(
+            est_delta[:, :, k] / est_gamma[k], (train_X - est_m[k, :]).T).T + 1 / est_beta[k]
+        est_h_xi[:, k] = -M / 2 * np.log(2 * np.pi) + psi(est_alpha[k]) - psi(est_alpha.sum()) - est_g_eta.sum(
+            axis=1) / 2 + multipsi(est_gamma[k] / 2, M) / 2 + M / 2 * np.log(2) - np.linalg.slogdet(est_delta[:, :, k])[1] / 2
+    return est_h_xi
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    K = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    M = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    iteration = 10
+    learning_seed = 1
+
+    rng = np.random.default_rng(1)
+    true_m = rng.normal(scale = 4, size = (K, M))
+    train_X = true_m[rng.integers(K, size = n)] + rng.normal(size = (n, M))
+
+    ### The same initial value as _fit_full with restart_num = 1.
+    np.random.seed(learning_seed)
+    est_u_xi = np.random.dirichlet(alpha = np.ones(K), size = n)
+
+    estimator = GaussianMixtureModelVB(K = K, method = "full", pri_gamma = M + 2, restart_num = 1, learning_seed = learning_seed, iteration = 1, step = 1)
+    estimator.fit(train_X)
+    assert np.allclose(estimator.result_["h_xi"], full_step_reference(estimator, train_X, est_u_xi), rtol = 1e-8)
+
+    start = time.perf_counter()
+    for _ in range(iteration):
+        full_step_reference(estimator, train_X, est_u_xi)
+    reference = (time.perf_counter() - start) / iteration
+
+    estimator.set_params(iteration = iteration, tol = -1)
+    start = time.perf_counter()
+    estimator.fit(train_X)
+    batched = (time.perf_counter() - start) / iteration
+
+    print(f"n={n}, K={K}, M={M}")
+    print("%-12s %16s" % ("engine", "iteration[ms]"))
+    print("%-12s %16.1f" % ("per-k", reference * 1e3))
+    print("%-12s %16.1f" % ("batched", batched * 1e3))
@@ -0,0 +1,76 @@
+"""
+Benchmark of HyperbolicSecantMixtureVB.fit.
+Wall time and peak memory of the broadcast engine are compared with
+the former implementation, which expanded every n * K * M term by np.repeat.
+
+Usage (in this directory):
+    python hsmm_fit.py [n] [K] [M]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+sys.path.append("../hypsecant_related")
+import time
+import tracemalloc
+
+## 3rd party libraries
+import numpy as np
+from scipy.special import psi
+
+## local libraries
+from util import logcosh, ratio_tanh_x
+from HyperbolicSecantMixtureModelVB import HyperbolicSecantMixtureVB
+
+
+def fit_by_repeat(train_X:np.ndarray, K:int, iteration:int, pri_alpha:float = 0.1, pri_beta:float = 0.001, pri_gamma:float = 2, pri_delta:float = 2):
+    """
+    The former iteration of HyperbolicSecantMixtureVB.fit, kept here as the reference.
+    """
+    (n, M) = train_X.shape
+    expand_x = np.repeat(train_X, K).reshape(n, M, K).transpose((0, 2, 1))
+    est_u_xi = np.random.dirichlet(alpha = np.ones(K), size=n)
+    est_g_eta = np.abs(np.random.normal(size=(n,K,M)))
+    est_v_eta = -np.repeat(est_u_xi, M).reshape(n, K, M) * ratio_tanh_x(np.sqrt(est_g_eta)/2)/8
+    for ite in range(iteration):
+        est_alpha = pri_alpha + est_u_xi.sum(axis = 0)
+        est_beta = pri_beta + (-2*est_v_eta.sum(axis = 0))
+        est_m = -2 * (expand_x * est_v_eta).sum(axis = 0) / est_beta
+        est_gamma = np.repeat(pri_gamma + est_u_xi.sum(axis = 0)/2, M).reshape(K,M)
+        est_delta = pri_delta - (expand_x**2 * est_v_eta).sum(axis = 0) - est_beta / 2 * est_m**2
+        est_g_eta = np.repeat(est_gamma / est_delta, n).reshape(K,M,n).transpose((2,0,1)) * (expand_x - np.repeat(est_m,n).reshape(K,M,n).transpose((2,0,1)))**2 + 1/np.repeat(est_beta, n).reshape(K,M,n).transpose((2,0,1))
+        est_v_eta = - np.repeat(est_u_xi, M).reshape(n, K, M) * ratio_tanh_x(np.sqrt(est_g_eta)/2)/8
+        sqrt_g_eta = np.sqrt(est_g_eta)
+        est_h_xi = np.repeat(psi(est_alpha) - psi(est_alpha.sum()) + (psi(est_gamma) - np.log(est_delta)).sum(axis = 1)/2 - M*np.log(2*np.pi)/2, n).reshape(K,n).T - logcosh(sqrt_g_eta/2).sum(axis = 2)
+        max_h_xi = est_h_xi.max(axis = 1)
+        norm_h_xi = est_h_xi - np.repeat(max_h_xi, K).reshape(n,K)
+        est_u_xi = np.exp(norm_h_xi) / np.repeat(np.exp(norm_h_xi).sum(axis = 1), K).reshape(n, K)
+    return est_u_xi
+
+
+def measure(func):
+    """
+    Return wall time [s] and peak memory [MB] traced during func().
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return (elapsed, peak)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    K = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    M = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    iteration = 20
+
+    train_X = np.random.normal(size=(n, M))
+    ### tol < 0 lets the iteration run until the end.
+    estimator = HyperbolicSecantMixtureVB(K = K, iteration = iteration, restart_num = 1, learning_seed = 1, tol = -1, step = iteration)
+
+    print(f"n={n}, K={K}, M={M}, {iteration} iterations")
+    print("%-12s %10s %12s" % ("engine", "time[s]", "peak[MB]"))
+    print("%-12s %10.3f %12.1f" % (("repeat",) + measure(lambda: fit_by_repeat(train_X, K, iteration))))
+    print("%-12s %10.3f %12.1f" % (("broadcast",) + measure(lambda: estimator.fit(train_X))))
@@ -0,0 +1,61 @@
+"""
+Check of HyperbolicSecantMixtureVB.partial_fit against fit.
+partial_fit of the whole data with learning_decay=0 is a plain VB iteration in another update order,
+so both are run until convergence from the same initial value, and the results are checked to agree.
+The energy of each path in the first iterations is also shown, which differs by the update order.
+
+Usage (in this directory):
+    python hsmm_svi.py [n] [K] [M]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+sys.path.append("../hypsecant_related")
+import time
+
+## 3rd party libraries
+import numpy as np
+
+## local libraries
+from HyperbolicSecantMixtureModelVB import HyperbolicSecantMixtureVB
+
+### Bounds of the relative difference of the final energy and the difference of the parameters.
+ENERGY_RTOL = 1e-8
+PARAMS_ATOL = 1e-4
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    K = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    M = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    iteration = 5000
+    tol = 1e-10
+
+    rng = np.random.default_rng(1)
+    true_m = rng.normal(scale = 4, size = (K, M))
+    train_X = true_m[rng.integers(K, size = n)] + rng.normal(size = (n, M))
+
+    start = time.perf_counter()
+    fit_estimator = HyperbolicSecantMixtureVB(K = K, iteration = iteration, restart_num = 1, learning_seed = 1, tol = tol, step = 1).fit(train_X)
+    fit_elapsed = time.perf_counter() - start
+
+    ### partial_fit draws the same initial value as fit with restart_num = 1.
+    svi_estimator = HyperbolicSecantMixtureVB(K = K, restart_num = 1, learning_seed = 1, learning_decay = 0)
+    start = time.perf_counter()
+    for ite in range(iteration):
+        svi_estimator.partial_fit(train_X)
+        energy = svi_estimator.result_["energy"]
+        if len(energy) > 1 and np.abs(energy[-1] - energy[-2]) < tol:
+            break
+    svi_elapsed = time.perf_counter() - start
+
+    print(f"n={n}, K={K}, M={M}, tol={tol}")
+    print("%-24s %10s %10s %20s   %s" % ("path", "iteration", "time[s]", "energy", "first energies"))
+    for (name, estimator, elapsed) in [("fit", fit_estimator, fit_elapsed), ("partial_fit", svi_estimator, svi_elapsed)]:
+        energy = estimator.result_["energy"]
+        print("%-24s %10d %10.3f %20.9f   %s" % (name, len(energy), elapsed, energy[-1], np.round(energy[:3], 3)))
+
+    energy_diff = np.abs(svi_estimator.result_["energy"][-1] - fit_estimator.result_["energy"][-1]) / np.abs(fit_estimator.result_["energy"][-1])
+    params_diff = max(np.abs(svi_estimator.result_[key] - fit_estimator.result_[key]).max() for key in ["ratio", "mean", "precision"])
+    print(f"relative energy difference {energy_diff:.2e} (bound {ENERGY_RTOL}), parameter difference {params_diff:.2e} (bound {PARAMS_ATOL})")
+    assert energy_diff < ENERGY_RTOL and params_diff < PARAMS_ATOL
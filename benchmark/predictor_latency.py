@@ -0,0 +1,80 @@
+"""
+Latency benchmark of MixturePredictor made by compile_predictor.
+The single-row path is compared with predict_logproba of the estimator called one row at a time,
+and the chunked batch path with score_samples of the estimator on the whole data.
+After the scoring, the size of a restart task pickled for n_jobs is also checked,
+since the cache of the scoring must not be sent to the processes.
+
+Usage (in this directory):
+    python predictor_latency.py [n] [K] [M]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+sys.path.append("../hypsecant_related")
+import pickle
+import time
+import tracemalloc
+
+## 3rd party libraries
+import numpy as np
+
+## local libraries
+from learning import GaussianMixtureModelVB
+from HyperbolicSecantMixtureModelVB import HyperbolicSecantMixtureVB
+
+### Bound of the pickled size of a restart task, which does not depend on the fitted data.
+TASK_BYTES_BOUND = 2**14
+
+
+def measure_latency(func, n_rows:int):
+    """
+    Return mean wall time [us] of func(i) for i = 0, ..., n_rows - 1.
+    """
+    start = time.perf_counter()
+    for i in range(n_rows):
+        func(i)
+    return (time.perf_counter() - start) / n_rows * 1e6
+
+
+def measure(func):
+    """
+    Return wall time [s] and peak memory [MB] traced during func().
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return (elapsed, peak)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    K = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    M = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    n_rows = 2000
+
+    rng = np.random.default_rng(1)
+    true_m = rng.normal(scale = 4, size = (K, M))
+    train_X = true_m[rng.integers(K, size = 2000)] + rng.normal(size = (2000, M))
+    test_X = true_m[rng.integers(K, size = n)] + rng.normal(size = (n, M))
+
+    print(f"n={n}, K={K}, M={M}")
+    print("%-44s %14s %12s %12s" % ("estimator", "single[us]", "batch[s]", "peak[MB]"))
+    for estimator in [HyperbolicSecantMixtureVB(K = K, restart_num = 1, learning_seed = 1),
+                      GaussianMixtureModelVB(K = K, restart_num = 1, learning_seed = 1),
+                      GaussianMixtureModelVB(K = K, restart_num = 1, learning_seed = 1, method = "full", pri_gamma = M + 2)]:
+        estimator.fit(train_X)
+        predictor = estimator.compile_predictor(max_bytes = 2**25)
+        name = type(estimator).__name__ + "/" + getattr(estimator, "method", "diag")
+
+        single = measure_latency(lambda i: estimator.predict_logproba(test_X[i:i+1]), n_rows)
+        print("%-44s %14.1f %12.3f %12.1f" % ((name + "/estimator", single) + measure(lambda: estimator.score_samples(test_X))))
+        single = measure_latency(lambda i: predictor.score_one(test_X[i]), n_rows)
+        print("%-44s %14.1f %12.3f %12.1f" % ((name + "/predictor", single) + measure(lambda: predictor.score_samples(test_X))))
+
+        task_bytes = len(pickle.dumps(estimator._copy_unfitted()._fit_restart_from_seed))
+        print(f"pickled restart task {task_bytes} bytes (bound {TASK_BYTES_BOUND})")
+        assert task_bytes < TASK_BYTES_BOUND
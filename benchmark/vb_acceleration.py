@@ -0,0 +1,68 @@
+"""
+Benchmark of the SQUAREM acceleration of the VB mixture estimators.
+The number of evaluations of the update map and the wall time until convergence
+are compared with the plain iteration, and the energy recorded by SQUAREM is checked not to increase.
+
+Usage (in this directory):
+    python vb_acceleration.py [n] [K] [M]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+sys.path.append("../hypsecant_related")
+import time
+
+## 3rd party libraries
+import numpy as np
+
+## local libraries
+from learning import GaussianMixtureModelVB
+from HyperbolicSecantMixtureModelVB import HyperbolicSecantMixtureVB
+
+### Bound of the increase of the recorded energy relative to its magnitude, i.e. rounding error.
+ENERGY_RTOL = 1e-9
+
+
+class CountingMixin:
+    """
+    Count the evaluations of _vb_map.
+    """
+    n_maps = 0
+    def _vb_map(self, train_X, params, latent = None):
+        type(self).n_maps += 1
+        return super()._vb_map(train_X, params, latent)
+
+
+class CountingHSMM(CountingMixin, HyperbolicSecantMixtureVB):
+    pass
+
+
+class CountingGMM(CountingMixin, GaussianMixtureModelVB):
+    pass
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    K = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    M = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    tol = 1e-6
+
+    rng = np.random.default_rng(1)
+    true_m = rng.normal(scale = 4, size = (K, M))
+    train_X = true_m[rng.integers(K, size = n)] + rng.normal(size = (n, M))
+
+    print(f"n={n}, K={K}, M={M}, tol={tol}")
+    print("%-28s %10s %10s %16s" % ("estimator", "maps", "time[s]", "energy"))
+    for cls in [CountingHSMM, CountingGMM]:
+        for acceleration in [None, "squarem"]:
+            cls.n_maps = 0
+            estimator = cls(K = K, iteration = 10000, restart_num = 1, learning_seed = 1, tol = tol, step = 1, acceleration = acceleration)
+            start = time.perf_counter()
+            estimator.fit(train_X)
+            elapsed = time.perf_counter() - start
+            ### The plain iteration does not call _vb_map, so the number of recorded energies is shown.
+            maps = cls.n_maps if acceleration is not None else len(estimator.result_["energy"])
+            energy = estimator.result_["energy"]
+            print("%-28s %10d %10.3f %16.6f" % (cls.__bases__[1].__name__ + "/" + str(acceleration), maps, elapsed, energy[-1]))
+            if acceleration is not None:
+                assert np.all(np.diff(energy) <= ENERGY_RTOL * np.abs(energy[0]))
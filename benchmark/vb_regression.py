@@ -0,0 +1,61 @@
+"""
+Check of the VB linear regressors refitted with another covariance.
+Each estimator is fitted with covariance="diag" and then refitted with covariance="full" from that posterior,
+and the refit is checked to agree with the fit with covariance="full" from the random initial value.
+The objective F_ recorded by each fit is also checked not to increase.
+
+Usage (in this directory):
+    python vb_regression.py [n] [M]
+"""
+## standard libraries
+import sys
+sys.path.append("../lib")
+import time
+
+## 3rd party libraries
+import numpy as np
+
+## local libraries
+from learning import VBLaplace, VBApproxLaplace
+
+### Bound of the difference of the posterior mean between the refit and the fit from the random initial value.
+MEAN_ATOL = 1e-3
+### Bound of the increase of F_ relative to its magnitude, i.e. rounding error.
+OBJECTIVE_RTOL = 1e-9
+
+
+def max_increase(F: list) -> float:
+    """
+    Largest increase of F relative to |F_0|, which is not positive for a monotone decrease.
+    """
+    return np.diff(F).max() / np.abs(F[0]) if len(F) > 1 else 0.0
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    M = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    rng = np.random.default_rng(1)
+    true_w = rng.laplace(size = M) * (rng.random(size = M) < 0.3)
+    train_X = rng.normal(size = (n, M))
+    train_Y = train_X @ true_w + rng.normal(size = n)
+
+    print(f"n={n}, M={M}")
+    print("%-16s %12s %12s %12s %16s" % ("estimator", "refit[s]", "fit[s]", "mean diff", "max F increase"))
+    for estimator_class in [VBLaplace, VBApproxLaplace]:
+        refit_estimator = estimator_class(seed = 1, covariance = "diag").fit(train_X, train_Y)
+        F_increase = [max_increase(refit_estimator.F_)]
+        refit_estimator.set_params(covariance = "full")
+        start = time.perf_counter()
+        refit_estimator.fit(train_X, train_Y)
+        refit_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fit_estimator = estimator_class(seed = 1, covariance = "full").fit(train_X, train_Y)
+        fit_elapsed = time.perf_counter() - start
+
+        F_increase += [max_increase(refit_estimator.F_), max_increase(fit_estimator.F_)]
+
+        mean_diff = np.abs(refit_estimator.mean_ - fit_estimator.mean_).max()
+        print("%-16s %12.3f %12.3f %12.2e %16.2e" % (estimator_class.__name__, refit_elapsed, fit_elapsed, mean_diff, max(F_increase)))
+        assert mean_diff < MEAN_ATOL and max(F_increase) <= OBJECTIVE_RTOL
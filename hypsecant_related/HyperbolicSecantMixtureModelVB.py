@@ -69,7 +69,9 @@ class HyperbolicSecantMixtureVB(AbstractMixtureModel, DensityMixin, BaseEstimato
 
     def __init__(self, K:int = 3,
                  pri_alpha:float = 0.1, pri_beta:float = 0.001, pri_gamma:float = 2, pri_delta:float = 2,
-                 iteration:int = 1000, restart_num:int = 5, learning_seed:int = -1, tol:float = 1e-5, step:int = 20, is_trace:bool = False):
+                 iteration:int = 1000, restart_num:int = 5, learning_seed:int = -1, tol:float = 1e-5, step:int = 20, is_trace:bool = False,
+                 n_jobs:int = None, batch_restarts:bool = False, learning_offset:float = 10, learning_decay:float = 0.7,
+                 acceleration:str = None, prune_threshold:float = None, dtype:type = np.float64):
         """
         Initialize the following parameters:
         1. pri_alpha: hyperparameter for prior distribution of symmetric Dirichlet distribution.
@@ -81,8 +83,26 @@ class HyperbolicSecantMixtureVB(AbstractMixtureModel, DensityMixin, BaseEstimato
         7. learning_seed: Seed for initial values.
         8. tol: tolerance to stop the algorithm
         9. step: interval to calculate the objective function
-            Note: Since evaluating the objective function is a little bit heavy (roughly it may have O(n*M*K)),
-            so by this parameter we avoid watching the value every time.
+            Note: The objective function of fit reuses the values calculated in the update, so it costs O(n*K) rather than O(n*M*K),
+            and step=1 checks the convergence every iteration at little cost.
+        10. n_jobs: Number of processes to run the restarts in parallel, -1 means the number of cpus.
+            Note: When n_jobs is None, restarts run in this process with the global seed of numpy as before.
+            Otherwise, each restart uses its own np.random.Generator derived from learning_seed,
+            and the result is same for any n_jobs.
+        11. batch_restarts: If True, all the restarts run together as one batched computation.
+            Note: This is efficient for small or medium n, where starting processes costs more than the fit itself.
+            The initial values are same as those of n_jobs, so the result is same as the case of n_jobs.
+        12. learning_offset, learning_decay: step size rho_t = (learning_offset + t)^{-learning_decay} of partial_fit.
+            Note: 0.5 < learning_decay <= 1 satisfies the Robbins-Monro condition.
+        13. acceleration: "squarem" accelerates the iteration of fit by SQUAREM, None means the plain iteration.
+            Note: In this case energy is recorded every SQUAREM cycle, and step is not used.
+        14. prune_threshold: component whose expected number of data sum_i u_{ik} is less than this value is removed during fit,
+            None means no component is removed.
+            Note: Original index of each surviving component is stored in result_["active_components"].
+            Since the number of components differs among restarts, it can not be used with batch_restarts or acceleration.
+        15. dtype: precision of the n * K * M and n * K variables (g_eta, v_eta, h_xi and u_xi) in fit, including batch_restarts and acceleration.
+            Note: np.float32 halves the memory traffic of the iteration.
+            The posterior distribution of the parameter is accumulated in float64 and the energy is also float64.
         """
         self.K = K
         self.pri_alpha = pri_alpha
@@ -95,6 +115,13 @@ class HyperbolicSecantMixtureVB(AbstractMixtureModel, DensityMixin, BaseEstimato
         self.tol = tol
         self.step = step
         self.is_trace = is_trace
+        self.n_jobs = n_jobs
+        self.batch_restarts = batch_restarts
+        self.learning_offset = learning_offset
+        self.learning_decay = learning_decay
+        self.acceleration = acceleration
+        self.prune_threshold = prune_threshold
+        self.dtype = dtype
         pass
 
     def fit(self, train_X:np.ndarray, y:np.ndarray=None):
@@ -119,89 +146,447 @@ class HyperbolicSecantMixtureVB(AbstractMixtureModel, DensityMixin, BaseEstimato
                 9. v_eta: Value of auxiliary variable, which represents v(\eta) in the algorithm.
                 10. energy: Value of the best evaluation function.
                 11. seed: Value of the best learning seed.
+                12. active_components: Original index of each component in the above parameters.
         """
 
+        if self.acceleration not in (None, "squarem"):
+            raise ValueError(f"acceleration must be None or \"squarem\", but {self.acceleration!r} is given.")
+        if self.batch_restarts and self.acceleration is not None:
+            raise ValueError("batch_restarts can not be used with acceleration.")
+        if self.prune_threshold is not None and (self.batch_restarts or self.acceleration is not None):
+            raise ValueError("prune_threshold can not be used with batch_restarts or acceleration.")
+        if self.batch_restarts:
+            return self._fit_restarts_in_batch(train_X)
+        if self.n_jobs is not None:
+            return self._fit_restarts_in_parallel(train_X)
+
         (n, M) = train_X.shape
         if self.learning_seed > 0:
             np.random.seed(self.learning_seed)
 
-        ### Setting for static variable in the algorithm.
-        expand_x = np.repeat(train_X, self.K).reshape(n, M, self.K).transpose((0, 2, 1))
-        ### n * K * M data with the same matrix among 2nd dimension
+        ### n * K * M work buffers reused among the iterations and the restarts.
+        work = self._init_work_buffers(n, M)
 
         min_energy = np.inf
         result = dict()
 
         for restart in range(self.restart_num):
-            energy = np.zeros(np.floor(self.iteration/self.step).astype(int))
-            calc_ind = 0
             ### Setting for initial value
-            # est_alpha = np.random.dirichlet(alpha = np.ones(self.K), size = 1)
-            # est_m = np.random.normal(size = (self.K, M))
-            # est_gamma = np.random.gamma(shape=1, size = (self.K, M))
-            # est_delta = np.random.gamma(shape=1, size = (self.K, M))
-            # est_beta = np.random.gamma(shape=1, size=(self.K, M))
-
             est_u_xi = np.random.dirichlet(alpha = np.ones(self.K), size=n)
-            est_g_eta = np.abs(np.random.normal(size=(n,self.K,M)))
-            est_v_eta = -np.repeat(est_u_xi, M).reshape(n, self.K, M) * ratio_tanh_x(np.sqrt(est_g_eta)/2)/8
-
-            ### Start learning.
-            for ite in range(self.iteration):
-                ### Update posterior distribution of parameter
-                est_alpha = self.pri_alpha + est_u_xi.sum(axis = 0)
-                est_beta = self.pri_beta + (-2*est_v_eta.sum(axis = 0))
-                est_m = -2 * (expand_x * est_v_eta).sum(axis = 0) / est_beta
-                est_gamma = np.repeat(self.pri_gamma + est_u_xi.sum(axis = 0)/2, M).reshape(self.K,M)
-                est_delta = self.pri_delta - (expand_x**2 * est_v_eta).sum(axis = 0) - est_beta / 2 * est_m**2
-
-                ### Update auxiliary variables
-                est_g_eta = np.repeat(est_gamma / est_delta, n).reshape(self.K,M,n).transpose((2,0,1)) * (expand_x - np.repeat(est_m,n).reshape(self.K,M,n).transpose((2,0,1)))**2 + 1/np.repeat(est_beta, n).reshape(self.K,M,n).transpose((2,0,1))
-                est_v_eta = - np.repeat(est_u_xi, M).reshape(n, self.K, M) * ratio_tanh_x(np.sqrt(est_g_eta)/2)/8
-
-                ### Update posterior distribution of latent variable
-                sqrt_g_eta = np.sqrt(est_g_eta)
-                est_h_xi = np.repeat(psi(est_alpha) - psi(est_alpha.sum()) + (psi(est_gamma) - np.log(est_delta)).sum(axis = 1)/2 - M*np.log(2*np.pi)/2, n).reshape(self.K,n).T - logcosh(sqrt_g_eta/2).sum(axis = 2)
-                max_h_xi = est_h_xi.max(axis = 1)
-                norm_h_xi = est_h_xi - np.repeat(max_h_xi, self.K).reshape(n,self.K)
-                est_u_xi = np.exp(norm_h_xi) / np.repeat(np.exp(norm_h_xi).sum(axis = 1), self.K).reshape(n, self.K)
-
-                if ite % self.step == 0:
-                    ### Calculate evaluation function
-                    energy[calc_ind] =  self._calc_obj_func(est_u_xi = est_u_xi, est_h_xi = est_h_xi,
-                                                            est_v_eta = est_v_eta, est_g_eta = est_g_eta,
-                                                            est_alpha = est_alpha, est_beta = est_beta, est_gamma = est_gamma, est_delta = est_delta)
-                    if self.is_trace: print(energy[calc_ind])
-                    if calc_ind > 0 and np.abs(energy[calc_ind] - energy[calc_ind-1]) < self.tol:
-                        energy = energy[:calc_ind]
-                        break
-                    calc_ind += 1
-                    pass
-                pass
-            energy[-1] = self._calc_obj_func(est_u_xi = est_u_xi, est_h_xi = est_h_xi, est_v_eta = est_v_eta, est_g_eta = est_g_eta,
-                                             est_alpha = est_alpha, est_beta = est_beta, est_gamma = est_gamma, est_delta = est_delta)
-            # energy = energy[:calc_ind]
+            np.abs(np.random.normal(size=(n,self.K,M)), out = work["g_eta"])
+
+            est_params = self._fit_restart(train_X, est_u_xi, work)
+            energy = est_params["energy"]
             if self.is_trace: print(energy[-1])
             if energy[-1] < min_energy:
                 min_energy = energy[-1]
-                result["ratio"] = est_alpha / est_alpha.sum()
-                result["mean"] = est_m
-                result["precision"] = est_gamma / est_delta
-                result["scale"] = np.array([np.diag(est_delta[k,:] / est_gamma[k,:]) for k in range(self.K)])
-                result["alpha"] = est_alpha
-                result["beta"] = est_beta
-                result["mu"] = est_m
-                result["gamma"] = est_gamma
-                result["delta"] = est_delta
-                result["h_xi"] = est_h_xi
-                result["u_xi"] = est_u_xi
-                result["g_eta"] = est_g_eta
-                result["v_eta"] = est_v_eta
-                result["energy"] = energy
+                result = self._make_result(est_params)
+                ### Buffers are overwritten by the next restart, so the best one is kept as a copy.
+                for key in ["g_eta", "v_eta"]:
+                    if result[key] is work[key]:
+                        result[key] = work[key].copy()
             pass
         self.result_ = result
         return self
 
+    def _init_work_buffers(self, n:int, M:int) -> dict:
+        """
+        Allocate n * K * M buffers used in the iteration.
+        + Output:
+            1. g_eta: auxiliary variable g(eta).
+            2. v_eta: auxiliary variable v(eta).
+            3. tmp: buffer for intermediate values, e.g. x_{ij} v_{ikj}(eta) or sqrt{g_{ikj}(eta)}/2.
+        """
+        return {
+            "g_eta": np.empty((n, self.K, M), dtype = self.dtype),
+            "v_eta": np.empty((n, self.K, M), dtype = self.dtype),
+            "tmp": np.empty((n, self.K, M), dtype = self.dtype)
+        }
+
+    def _fit_restart(self, train_X:np.ndarray, est_u_xi:np.ndarray, work:dict) -> dict:
+        """
+        Run the algorithm from one initial value.
+        Every n * K * M quantity is evaluated by broadcasting into the buffers of work,
+        so that no n * K * M array is allocated in the iteration.
+
+        + Input:
+            1. train_X: n * M input data.
+            2. est_u_xi: n * K initial value of u_xi.
+            3. work: buffers made by _init_work_buffers, work["g_eta"] has to contain the initial value of g_eta.
+
+        + Output:
+            dictionary of the estimated parameters and the values of the evaluation function.
+            g_eta and v_eta refer to work["g_eta"] and work["v_eta"] unless acceleration is used or a component is removed.
+        """
+        (n, M) = train_X.shape
+        x = train_X.astype(self.dtype, copy = False)[:, np.newaxis, :]
+        x2 = x**2
+        est_u_xi = est_u_xi.astype(self.dtype, copy = False)
+        est_g_eta = work["g_eta"]
+        est_v_eta = work["v_eta"]
+        tmp = work["tmp"]
+
+        energy = np.zeros(np.floor(self.iteration/self.step).astype(int))
+        calc_ind = 0
+
+        np.sqrt(est_g_eta, out = tmp)
+        tmp /= 2
+        ratio_tanh_x(tmp, out = est_v_eta)
+        est_v_eta *= est_u_xi[:, :, np.newaxis]
+        est_v_eta /= -8
+
+        if self.acceleration == "squarem":
+            return self._fit_restart_squarem(train_X, self._calc_params(train_X, est_u_xi, est_v_eta), {"u_xi": est_u_xi, "v_eta": est_v_eta})
+
+        active_components = np.arange(self.K)
+        stats = self._calc_stats(x, x2, est_v_eta, tmp)
+
+        ### Start learning.
+        for ite in range(self.iteration):
+            ### Collapsed components are removed, and the buffers are shrunk to the surviving ones.
+            (keep, est_u_xi) = self._prune_latent_variables(est_u_xi)
+            if keep is not None:
+                active_components = active_components[keep]
+                est_g_eta = est_g_eta[:, keep, :]
+                tmp = tmp[:, keep, :]
+                np.sqrt(est_g_eta, out = tmp)
+                tmp /= 2
+                est_v_eta = ratio_tanh_x(tmp)
+                est_v_eta *= est_u_xi[:, :, np.newaxis]
+                est_v_eta /= -8
+                stats = self._calc_stats(x, x2, est_v_eta, tmp)
+
+            ### Update posterior distribution of parameter
+            sum_u_xi = est_u_xi.sum(axis = 0, dtype = np.float64)
+            est_alpha = self.pri_alpha + sum_u_xi
+            est_beta = self.pri_beta + (-2*stats["v"])
+            est_m = -2 * stats["xv"] / est_beta
+            est_gamma = np.repeat(self.pri_gamma + sum_u_xi/2, M).reshape(len(est_alpha),M)
+            est_delta = self.pri_delta - stats["x2v"] - est_beta / 2 * est_m**2
+
+            ### Update auxiliary variables
+            np.subtract(x, est_m, out = est_g_eta)
+            np.square(est_g_eta, out = est_g_eta)
+            est_g_eta *= est_gamma / est_delta
+            est_g_eta += 1/est_beta
+
+            ### tmp keeps sqrt{g_eta}/2 until h_xi is calculated, where logcosh overwrites it in place.
+            np.sqrt(est_g_eta, out = tmp)
+            tmp /= 2
+            ratio_tanh_x(tmp, out = est_v_eta)
+            est_v_eta *= est_u_xi[:, :, np.newaxis]
+            est_v_eta /= -8
+
+            ### Update posterior distribution of latent variable
+            est_c_xi = psi(est_alpha) - psi(est_alpha.sum()) + (psi(est_gamma) - np.log(est_delta)).sum(axis = 1)/2 - M*np.log(2*np.pi)/2
+            est_h_xi = np.subtract(est_c_xi, logcosh(tmp, out = tmp).sum(axis = 2), dtype = self.dtype)
+            max_h_xi = est_h_xi.max(axis = 1)
+            norm_h_xi = est_h_xi - max_h_xi[:, np.newaxis]
+            est_u_xi = np.exp(norm_h_xi)
+            norm_u_xi = est_u_xi.sum(axis = 1)
+            est_u_xi /= norm_u_xi[:, np.newaxis]
+
+            ### Sufficient statistics of the next update, which are also used by the evaluation function.
+            stats = self._calc_stats(x, x2, est_v_eta, tmp)
+
+            if ite % self.step == 0:
+                ### Calculate evaluation function
+                energy[calc_ind] = self._calc_incremental_obj_func(est_u_xi = est_u_xi, est_log_norm = np.log(norm_u_xi) + max_h_xi,
+                                                                   est_c_xi = est_c_xi, stats = stats, est_m = est_m,
+                                                                   est_alpha = est_alpha, est_beta = est_beta, est_gamma = est_gamma, est_delta = est_delta)
+                if self.is_trace: print(energy[calc_ind])
+                if calc_ind > 0 and np.abs(energy[calc_ind] - energy[calc_ind-1]) < self.tol:
+                    energy = energy[:calc_ind]
+                    break
+                calc_ind += 1
+                pass
+            pass
+        energy[-1] = self._calc_incremental_obj_func(est_u_xi = est_u_xi, est_log_norm = np.log(norm_u_xi) + max_h_xi,
+                                                     est_c_xi = est_c_xi, stats = stats, est_m = est_m,
+                                                     est_alpha = est_alpha, est_beta = est_beta, est_gamma = est_gamma, est_delta = est_delta)
+        return {
+            "alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta,
+            "h_xi": est_h_xi, "u_xi": est_u_xi, "g_eta": est_g_eta, "v_eta": est_v_eta, "energy": energy,
+            "active_components": active_components
+        }
+
+    def _calc_stats(self, x:np.ndarray, x2:np.ndarray, est_v_eta:np.ndarray, tmp:np.ndarray) -> dict:
+        """
+        Sufficient statistics of update 2. of the algorithm, sum_i v_{ikj}(eta), sum_i v_{ikj}(eta)x_{ij} and sum_i v_{ikj}(eta)x_{ij}^2.
+        They are accumulated in float64 for any dtype. tmp is overwritten.
+        """
+        return {
+            "v": est_v_eta.sum(axis = 0, dtype = np.float64),
+            "xv": np.multiply(x, est_v_eta, out = tmp).sum(axis = 0, dtype = np.float64),
+            "x2v": np.multiply(x2, est_v_eta, out = tmp).sum(axis = 0, dtype = np.float64)
+        }
+
+    def _calc_params(self, train_X:np.ndarray, est_u_xi:np.ndarray, est_v_eta:np.ndarray) -> dict:
+        """
+        Update 2. of the algorithm, posterior distribution of parameter is calculated from u_xi and v_eta.
+        """
+        M = train_X.shape[1]
+        est_alpha = self.pri_alpha + est_u_xi.sum(axis = 0, dtype = np.float64)
+        est_beta = self.pri_beta + (-2*est_v_eta.sum(axis = 0, dtype = np.float64))
+        est_m = -2 * np.einsum("ij,ikj->kj", train_X, est_v_eta, dtype = np.float64) / est_beta
+        est_gamma = np.repeat(self.pri_gamma + est_u_xi.sum(axis = 0, dtype = np.float64)/2, M).reshape(len(est_alpha),M)
+        est_delta = self.pri_delta - np.einsum("ij,ikj->kj", train_X**2, est_v_eta, dtype = np.float64) - est_beta / 2 * est_m**2
+        return {"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta}
+
+    def _vb_map(self, train_X:np.ndarray, params:dict, latent:dict = None):
+        """
+        One update of the algorithm as a map of the posterior distribution of the parameter, used by _fit_restart_squarem.
+        Different from _fit_restart, v_eta is calculated from u_xi updated by params.
+        The energy is -ELBO at params, where the terms u(xi) cdot h(xi) and v(eta) cdot g(eta) are of latent["u_xi"] and latent["v_eta"],
+        from which params is updated. It is np.nan when latent is None.
+        """
+        est_params = self._calc_local_variables(train_X, dict(params, mu = params["m"]), dtype = self.dtype)
+        energy = np.nan if latent is None else self._calc_obj_func(**dict(est_params, est_u_xi = latent["u_xi"], est_v_eta = latent["v_eta"]))
+        return (dict(params, h_xi = est_params["est_h_xi"], u_xi = est_params["est_u_xi"],
+                     g_eta = est_params["est_g_eta"], v_eta = est_params["est_v_eta"], energy = energy),
+                self._calc_params(train_X, est_params["est_u_xi"], est_params["est_v_eta"]))
+
+    def _fit_restart_from_seed(self, train_X:np.ndarray, seed:np.random.SeedSequence) -> dict:
+        """
+        One restart for _fit_restarts_in_parallel, the initial value is drawn by np.random.Generator of seed.
+        """
+        (n, M) = train_X.shape
+        rng = np.random.default_rng(seed)
+        work = self._init_work_buffers(n, M)
+        est_u_xi = rng.dirichlet(alpha = np.ones(self.K), size=n)
+        np.abs(rng.normal(size=(n,self.K,M)), out = work["g_eta"])
+
+        return self._make_result(self._fit_restart(train_X, est_u_xi, work))
+
+    def _fit_restart_from_latent(self, train_X:np.ndarray, latent:dict) -> dict:
+        """
+        One restart from the initial values latent["u_xi"] and latent["g_eta"], used by fit_K_sweep.
+        """
+        (n, M) = train_X.shape
+        work = self._init_work_buffers(n, M)
+        work["g_eta"][...] = latent["g_eta"]
+
+        return self._make_result(self._fit_restart(train_X, latent["u_xi"], work))
+
+    def _init_batch_state(self, train_X:np.ndarray, rngs:list) -> dict:
+        """
+        Initial value of _fit_restarts_in_batch, u_xi and g_eta are drawn by each np.random.Generator of rngs.
+        """
+        (n, M) = train_X.shape
+        est_u_xi = np.empty((len(rngs), n, self.K), dtype = self.dtype)
+        est_g_eta = np.empty((len(rngs), n, self.K, M), dtype = self.dtype)
+        for (r, rng) in enumerate(rngs):
+            est_u_xi[r] = rng.dirichlet(alpha = np.ones(self.K), size=n)
+            np.abs(rng.normal(size=(n,self.K,M)), out = est_g_eta[r])
+
+        tmp = np.sqrt(est_g_eta)
+        tmp /= 2
+        est_v_eta = np.multiply(est_u_xi[:, :, :, np.newaxis], ratio_tanh_x(tmp))
+        est_v_eta /= -8
+        return {"u_xi": est_u_xi, "g_eta": est_g_eta, "v_eta": est_v_eta, "tmp": tmp}
+
+    def _update_batch_state(self, train_X:np.ndarray, state:dict) -> dict:
+        """
+        One iteration of _fit_restart for R restarts, every variable has the leading axis R.
+        """
+        M = train_X.shape[1]
+        x = train_X.astype(self.dtype, copy = False)[np.newaxis, :, np.newaxis, :]
+        x2 = x**2
+        est_u_xi = state["u_xi"]
+        est_g_eta = state["g_eta"]
+        est_v_eta = state["v_eta"]
+        tmp = state["tmp"]
+
+        ### Update posterior distribution of parameter, the sums are accumulated in float64 for any dtype.
+        est_alpha = self.pri_alpha + est_u_xi.sum(axis = 1, dtype = np.float64)
+        est_beta = self.pri_beta + (-2*est_v_eta.sum(axis = 1, dtype = np.float64))
+        est_m = -2 * np.multiply(x, est_v_eta, out = tmp).sum(axis = 1, dtype = np.float64) / est_beta
+        est_gamma = np.repeat((self.pri_gamma + est_u_xi.sum(axis = 1, dtype = np.float64)/2)[:, :, np.newaxis], M, axis = 2)
+        est_delta = self.pri_delta - np.multiply(x2, est_v_eta, out = tmp).sum(axis = 1, dtype = np.float64) - est_beta / 2 * est_m**2
+
+        ### Update auxiliary variables
+        np.subtract(x, est_m[:, np.newaxis], out = est_g_eta)
+        np.square(est_g_eta, out = est_g_eta)
+        est_g_eta *= (est_gamma / est_delta)[:, np.newaxis]
+        est_g_eta += 1/est_beta[:, np.newaxis]
+
+        np.sqrt(est_g_eta, out = tmp)
+        tmp /= 2
+        ratio_tanh_x(tmp, out = est_v_eta)
+        est_v_eta *= est_u_xi[:, :, :, np.newaxis]
+        est_v_eta /= -8
+
+        ### Update posterior distribution of latent variable
+        est_c_xi = psi(est_alpha) - psi(est_alpha.sum(axis = 1))[:, np.newaxis] + (psi(est_gamma) - np.log(est_delta)).sum(axis = 2)/2 - M*np.log(2*np.pi)/2
+        est_h_xi = np.subtract(est_c_xi[:, np.newaxis, :], logcosh(tmp, out = tmp).sum(axis = 3), dtype = self.dtype)
+        max_h_xi = est_h_xi.max(axis = 2)
+        est_u_xi = np.exp(est_h_xi - max_h_xi[:, :, np.newaxis])
+        est_u_xi /= est_u_xi.sum(axis = 2)[:, :, np.newaxis]
+        state["u_xi"] = est_u_xi
+
+        return {"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta,
+                "h_xi": est_h_xi, "u_xi": est_u_xi, "g_eta": est_g_eta, "v_eta": est_v_eta}
+
+    def _make_result(self, est_params:dict) -> dict:
+        """
+        Convert the estimated parameters given by _fit_restart into the form of result_.
+        """
+        est_alpha = est_params["alpha"]
+        est_gamma = est_params["gamma"]
+        est_delta = est_params["delta"]
+        result = dict()
+        result["ratio"] = est_alpha / est_alpha.sum()
+        result["mean"] = est_params["m"]
+        result["precision"] = est_gamma / est_delta
+        result["scale"] = np.array([np.diag(est_delta[k,:] / est_gamma[k,:]) for k in range(len(est_alpha))])
+        result["alpha"] = est_alpha
+        result["beta"] = est_params["beta"]
+        result["mu"] = est_params["m"]
+        result["gamma"] = est_gamma
+        result["delta"] = est_delta
+        result["energy"] = est_params["energy"]
+        result["active_components"] = est_params.get("active_components", np.arange(len(est_alpha)))
+        ### Latent and auxiliary variables are not kept by partial_fit.
+        for key in ["h_xi", "u_xi", "g_eta", "v_eta"]:
+            if key in est_params:
+                result[key] = est_params[key]
+        return result
+
+    def partial_fit(self, train_X:np.ndarray, y:np.ndarray=None, total_samples:int=None):
+        """
+        Stochastic variational inference (SVI) for HSMM with a minibatch train_X.
+        The posterior distribution of the parameter is kept by the natural parameters:
+            # hat{alpha}_k, hat{beta}_{kj}, hat{beta}_{kj} hat{m}_{kj}, hat{gamma}_{kj}, hat{delta}_{kj} + frac{hat{beta}_{kj}}{2} hat{m}_{kj}^2
+        In the update 2. of fit, sum_{i=1}^n is replaced by frac{total_samples}{|B|} sum_{i in B} for the minibatch B,
+        and the natural parameters are moved toward the values by step size rho_t = (learning_offset + t)^{-learning_decay}.
+        u_xi, g_eta and v_eta are evaluated only on the minibatch from the current posterior distribution.
+        Note: Since no latent variable is kept between the calls, v_eta is given by u_xi updated in the same call (_calc_local_variables),
+        while _fit_restart uses u_xi of the previous iteration.
+        So partial_fit of the whole data with learning_decay=0 is not the same sequence as fit,
+        but it has the same fixed points, and both converge to the same energy from the same initial value.
+
+        + Input:
+            1. train_X: minibatch of input data.
+            2. total_samples: number of the whole data, the minibatch is regarded as the whole data if it is None.
+
+        + Output:
+            + result_ has the same parameters as fit except for h_xi, u_xi, g_eta and v_eta.
+            + result_["energy"] is the sequence of the estimated evaluation function by each minibatch.
+            + n_batch_iter_: number of the minibatches used so far.
+        """
+        (n, M) = train_X.shape
+        x = train_X[:, np.newaxis, :]
+        x2 = (train_X**2)[:, np.newaxis, :]
+        scale = (n if total_samples is None else total_samples) / n
+
+        if not hasattr(self, "result_"):
+            ### Setting for initial value in the same manner as fit.
+            if self.learning_seed > 0:
+                np.random.seed(self.learning_seed)
+            est_u_xi = np.random.dirichlet(alpha = np.ones(self.K), size=n)
+            est_g_eta = np.abs(np.random.normal(size=(n,self.K,M)))
+            est_v_eta = -est_u_xi[:, :, np.newaxis] * ratio_tanh_x(np.sqrt(est_g_eta)/2)/8
+            energy = np.zeros(0)
+            rho = 1
+            self.n_batch_iter_ = 0
+        else:
+            est_params = self._calc_local_variables(train_X, self.result_)
+            est_u_xi = est_params["est_u_xi"]
+            est_v_eta = est_params["est_v_eta"]
+            ### minibatch estimate of the evaluation function at the current posterior distribution.
+            energy = np.append(self.result_["energy"],
+                               scale * self._calc_local_obj_func(**est_params) + self._calc_global_obj_func(**est_params))
+            if self.is_trace: print(energy[-1])
+            if not hasattr(self, "n_batch_iter_"):
+                self.n_batch_iter_ = 0
+            rho = (self.learning_offset + self.n_batch_iter_)**(-self.learning_decay)
+
+        ### Natural parameters given by the minibatch
+        sum_u_xi = scale * est_u_xi.sum(axis = 0)
+        batch_natural_params = [
+            self.pri_alpha + sum_u_xi,
+            self.pri_beta + (-2*scale*est_v_eta.sum(axis = 0)),
+            -2*scale*(x * est_v_eta).sum(axis = 0),
+            np.repeat(self.pri_gamma + sum_u_xi/2, M).reshape(len(sum_u_xi),M),
+            self.pri_delta - scale*(x2 * est_v_eta).sum(axis = 0)
+        ]
+        if rho < 1:
+            natural_params = [
+                (1 - rho) * self.result_["alpha"],
+                (1 - rho) * self.result_["beta"],
+                (1 - rho) * self.result_["beta"] * self.result_["mu"],
+                (1 - rho) * self.result_["gamma"],
+                (1 - rho) * (self.result_["delta"] + self.result_["beta"] / 2 * self.result_["mu"]**2)
+            ]
+            natural_params = [param + rho * batch_param for (param, batch_param) in zip(natural_params, batch_natural_params)]
+        else:
+            natural_params = batch_natural_params
+
+        (est_alpha, est_beta, est_beta_m, est_gamma, est_delta_m2) = natural_params
+        est_m = est_beta_m / est_beta
+        est_delta = est_delta_m2 - est_beta / 2 * est_m**2
+
+        self.n_batch_iter_ += 1
+        self.result_ = self._make_result({"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta,
+                                          "energy": energy})
+        return self
+
+    def fit_svi(self, train_X:np.ndarray, y:np.ndarray=None, batch_size:int = 1000, n_epochs:int = 10):
+        """
+        SVI for HSMM by partial_fit over the minibatches of train_X.
+        Each minibatch is a block of contiguous rows, so np.memmap of the data on disk is read sequentially by the block.
+        The order of the minibatches is shuffled in each epoch.
+
+        + Input:
+            1. train_X: input data, np.memmap is admissible.
+            2. batch_size: number of data in a minibatch.
+            3. n_epochs: number of passes over train_X.
+        """
+        n = train_X.shape[0]
+        for attr in ["result_", "n_batch_iter_"]:
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+        rng = np.random.default_rng(self.learning_seed if self.learning_seed > 0 else None)
+        batch_starts = np.arange(0, n, batch_size)
+        for epoch in range(n_epochs):
+            for start in rng.permutation(batch_starts):
+                self.partial_fit(np.asarray(train_X[start:start+batch_size]), total_samples = n)
+        return self
+
+    def _calc_local_variables(self, train_X:np.ndarray, params:dict, dtype:type = np.float64) -> dict:
+        """
+        Update 3. and 4. of fit with the posterior distribution of params,
+        i.e. g_eta, v_eta, h_xi and u_xi are evaluated on train_X.
+
+        + Input:
+            1. train_X: input data.
+            2. params: dictionary which has alpha, beta, mu, gamma and delta, e.g. result_.
+            3. dtype: precision of g_eta, v_eta, h_xi and u_xi, fit with acceleration passes dtype of this estimator.
+
+        + Output:
+            dictionary of est_* values, which can be passed to _calc_obj_func.
+        """
+        M = train_X.shape[1]
+        est_alpha = params["alpha"]
+        est_beta = params["beta"]
+        est_m = params["mu"]
+        est_gamma = params["gamma"]
+        est_delta = params["delta"]
+
+        x = train_X.astype(dtype, copy = False)[:, np.newaxis, :]
+        est_g_eta = (est_gamma / est_delta).astype(dtype) * (x - est_m.astype(dtype))**2 + (1/est_beta).astype(dtype)
+        half_sqrt_g_eta = np.sqrt(est_g_eta)/2
+        est_c_xi = psi(est_alpha) - psi(est_alpha.sum()) + (psi(est_gamma) - np.log(est_delta)).sum(axis = 1)/2 - M*np.log(2*np.pi)/2
+        est_h_xi = np.subtract(est_c_xi, logcosh(half_sqrt_g_eta).sum(axis = 2), dtype = dtype)
+        est_u_xi = np.exp(est_h_xi - est_h_xi.max(axis = 1)[:, np.newaxis])
+        est_u_xi /= est_u_xi.sum(axis = 1)[:, np.newaxis]
+        est_v_eta = -est_u_xi[:, :, np.newaxis] * ratio_tanh_x(half_sqrt_g_eta)/8
+        return {
+            "est_alpha": est_alpha, "est_beta": est_beta, "est_m": est_m, "est_gamma": est_gamma, "est_delta": est_delta,
+            "est_h_xi": est_h_xi, "est_u_xi": est_u_xi, "est_g_eta": est_g_eta, "est_v_eta": est_v_eta
+        }
+
     def _logpdf(self, x:np.ndarray, mean:np.ndarray, precision:np.ndarray):
         """
         Calculate \log p(x|w) = \sum_{j=1}^M \log(\frac{\sqrt{s_j}}{2\pi} 1/cosh(\sqrt{s_j}/2(x_j - b_j)))
@@ -217,6 +602,24 @@ class HyperbolicSecantMixtureVB(AbstractMixtureModel, DensityMixin, BaseEstimato
         y = np.sqrt(expand_precision)*(x - np.repeat(mean, n).reshape(M,n).T)/2
         return(np.log(expand_precision)/2 - np.log(2*np.pi) - logcosh(y)).sum(axis = 1)
 
+    def _calc_scoring_params(self) -> dict:
+        """
+        Constants of each component for _calc_component_logpdf:
+            # frac{sqrt{s_{kj}}}{2}, frac{sqrt{s_{kj}}}{2} b_{kj} and sum_j frac{1}{2} log s_{kj} - M log 2pi
+        """
+        precision = self.result_["precision"]
+        half_sqrt_precision = np.sqrt(precision)/2
+        return {"half_sqrt_precision": half_sqrt_precision, "half_sqrt_precision_mean": half_sqrt_precision * self.result_["mean"],
+                "const": np.log(precision).sum(axis = 1)/2 - precision.shape[1]*np.log(2*np.pi)}
+
+    @staticmethod
+    def _calc_component_logpdf(test_X:np.ndarray, scoring_params:dict) -> np.ndarray:
+        """
+        n * K matrix of log p(x_i|b_k, s_k) by broadcasting, the same value as _logpdf of each component.
+        """
+        y = test_X[:, np.newaxis, :] * scoring_params["half_sqrt_precision"] - scoring_params["half_sqrt_precision_mean"]
+        return scoring_params["const"] - logcosh(y).sum(axis = 2)
+
     def _calc_obj_func(self, **kwargs) -> float:
         """
         -ELBO is calculated.
@@ -230,27 +633,67 @@ class HyperbolicSecantMixtureVB(AbstractMixtureModel, DensityMixin, BaseEstimato
             7. est_gamma
             8. est_delta
         """
+        return self._calc_local_obj_func(**kwargs) + self._calc_global_obj_func(**kwargs)
+
+    def _calc_incremental_obj_func(self, **kwargs) -> float:
+        """
+        -ELBO by the values already calculated in the iteration of _fit_restart, whose cost is O(n*K) instead of O(n*K*M).
+        Since h_{ik}(xi) = c_k - sum_j logcosh(sqrt{g_{ikj}(eta)}/2), the term u(xi) cdot logcosh + u(xi) cdot h(xi) is sum_k c_k sum_i u_{ik}(xi),
+        and v(eta) cdot g(eta) is given by the sufficient statistics of v(eta) for the next update:
+            # sum_{ij} v_{ikj}(eta) g_{ikj}(eta) = sum_j frac{hat{gamma}_{kj}}{hat{delta}_{kj}} (S2_{kj} - 2 hat{m}_{kj} S1_{kj} + hat{m}_{kj}^2 S0_{kj}) + frac{S0_{kj}}{hat{beta}_{kj}}
+        + Necessary arguments are as follows:
+            1. est_u_xi
+            2. est_log_norm: log sum_k exp(h_{ik}(xi)) of each i, the normalizer of u_xi.
+            3. est_c_xi: c_k
+            4. stats: sufficient statistics given by _calc_stats.
+            5. est_m, est_alpha, est_beta, est_gamma, est_delta
+        """
+        est_u_xi = kwargs["est_u_xi"]
+        stats = kwargs["stats"]
+        est_m = kwargs["est_m"]
+        est_beta = kwargs["est_beta"]
+
+        (n, M) = (est_u_xi.shape[0], est_m.shape[1])
+        energy = est_u_xi.sum(axis = 0, dtype = np.float64) @ kwargs["est_c_xi"] - kwargs["est_log_norm"].sum(dtype = np.float64)
+        energy += (kwargs["est_gamma"] / kwargs["est_delta"] * (stats["x2v"] - 2*est_m*stats["xv"] + est_m**2*stats["v"]) + stats["v"]/est_beta).sum()
+        energy += n*M*np.log(2*np.pi)
+        return energy + self._calc_global_obj_func(**kwargs)
+
+    def _calc_local_obj_func(self, **kwargs) -> float:
+        """
+        Terms of -ELBO summed over the data, i.e. the terms depending on est_u_xi, est_h_xi, est_v_eta and est_g_eta.
+        The value is proportional to the number of data, so it is scaled when it is evaluated on a minibatch.
+        """
         est_u_xi = kwargs["est_u_xi"]
         est_h_xi = kwargs["est_h_xi"]
         est_v_eta = kwargs["est_v_eta"]
         est_g_eta = kwargs["est_g_eta"]
-        est_alpha = kwargs["est_alpha"]
-        est_beta = kwargs["est_beta"]
-        est_gamma = kwargs["est_gamma"]
-        est_delta = kwargs["est_delta"]
 
         n, _, M = est_v_eta.shape
 
-        sqrt_g_eta = np.sqrt(est_g_eta)
         max_h_xi = est_h_xi.max(axis = 1)
-        norm_h_xi = est_h_xi - np.repeat(max_h_xi, self.K).reshape(n,self.K)
+        norm_h_xi = est_h_xi - max_h_xi[:, np.newaxis]
 
-        energy =  (np.repeat(est_u_xi, M).reshape(n, self.K, M) * logcosh(sqrt_g_eta/2)).sum() - (np.log(np.exp(norm_h_xi).sum(axis = 1)) + max_h_xi).sum() + (est_u_xi * est_h_xi).sum() + (est_v_eta * est_g_eta).sum()
-        energy += gammaln(est_alpha.sum()) - gammaln(self.K*self.pri_alpha) + (-gammaln(est_alpha) + gammaln(self.pri_alpha)).sum()
-        energy += (np.log(est_beta/self.pri_beta)/2 + est_gamma * np.log(est_delta) - self.pri_gamma * np.log(self.pri_delta) - gammaln(est_gamma) + gammaln(self.pri_gamma)).sum()
+        ### The sums are accumulated in float64 for any dtype of the variables.
+        energy =  np.einsum("ik,ik->", est_u_xi, logcosh(np.sqrt(est_g_eta)/2).sum(axis = 2, dtype = np.float64)) - (np.log(np.exp(norm_h_xi).sum(axis = 1)) + max_h_xi).sum(dtype = np.float64) \
+            + np.einsum("ik,ik->", est_u_xi, est_h_xi, dtype = np.float64) + np.einsum("ikj,ikj->", est_v_eta, est_g_eta, dtype = np.float64)
         energy += n*M*np.log(2*np.pi)
         return energy
 
+    def _calc_global_obj_func(self, **kwargs) -> float:
+        """
+        Terms of -ELBO depending only on the posterior distribution of the parameter,
+        i.e. est_alpha, est_beta, est_gamma and est_delta.
+        """
+        est_alpha = kwargs["est_alpha"]
+        est_beta = kwargs["est_beta"]
+        est_gamma = kwargs["est_gamma"]
+        est_delta = kwargs["est_delta"]
+
+        energy = gammaln(est_alpha.sum()) - gammaln(len(est_alpha)*self.pri_alpha) + (-gammaln(est_alpha) + gammaln(self.pri_alpha)).sum()
+        energy += (np.log(est_beta/self.pri_beta)/2 + est_gamma * np.log(est_delta) - self.pri_gamma * np.log(self.pri_delta) - gammaln(est_gamma) + gammaln(self.pri_gamma)).sum()
+        return energy
+
     def get_params(self, deep = True):
         return{
                "K": self.K,
@@ -262,7 +705,14 @@ class HyperbolicSecantMixtureVB(AbstractMixtureModel, DensityMixin, BaseEstimato
                "restart_num":self.restart_num,
                "learning_seed":self.learning_seed,
                "tol":self.tol,
-               "step":self.step
+               "step":self.step,
+               "n_jobs":self.n_jobs,
+               "batch_restarts":self.batch_restarts,
+               "learning_offset":self.learning_offset,
+               "learning_decay":self.learning_decay,
+               "acceleration":self.acceleration,
+               "prune_threshold":self.prune_threshold,
+               "dtype":self.dtype
         }
 
     def set_params(self, **params):
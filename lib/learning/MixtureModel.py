@@ -1,19 +1,24 @@
 """ Mixture Models """
 # standard libraries
+import os
+import copy
 import math
-import itertools
+import types
 from abc import ABCMeta, abstractmethod
 
 # 3rd party libraries
 import numpy as np
-from scipy.special import gammaln, psi, multigammaln
+from scipy.special import gammaln, psi
 from scipy.stats import multivariate_normal
+from scipy.optimize import linear_sum_assignment
+from scipy.linalg import solve_triangular
 from sklearn.base import BaseEstimator
 from sklearn.base import DensityMixin
 from sklearn.utils.validation import check_is_fitted
 
 # local libraries
-from util.elementary_function import logcosh, ratio_tanh_x, multipsi
+from util.elementary_function import logcosh, ratio_tanh_x, multipsi, multigammaln
+from util.parallel import map_shared
 
 """
 This is a library for probability distribution of mixture.
@@ -35,6 +40,10 @@ class AbstractMixtureModel(metaclass=ABCMeta):
             + alpha: mixture ratio.
             + mean: mean of each component
             + precision: precision of each component
+        2. learning_seed, restart_num and n_jobs are used by _fit_restarts_in_parallel.
+        3. _init_batch_state, _update_batch_state and _make_result are used by _fit_restarts_in_batch.
+        4. prune_threshold is used by _prune_latent_variables.
+        5. _fit_restart_from_latent is used by fit_K_sweep.
     """
 
     @abstractmethod
@@ -60,34 +69,417 @@ class AbstractMixtureModel(metaclass=ABCMeta):
         """
         raise NotImplementedError()
 
+    def _fit_restarts_in_parallel(self, train_X: np.ndarray):
+        """
+        Run restart_num restarts by a process pool with n_jobs processes, and keep the one with the lowest energy.
+        Each restart draws the initial value from its own np.random.Generator spawned from learning_seed,
+        so the result does not depend on n_jobs.
+        Each restart is _fit_restart_from_seed(train_X, seed) of a copy without the fitted attributes,
+        where seed is np.random.SeedSequence, and returns a dictionary of the form of result_.
+
+        + Input:
+            1. train_X: input data, shared among the processes by a read-only memory map.
+        """
+        seed_seq = np.random.SeedSequence(
+            self.learning_seed if self.learning_seed > 0 else None)
+        results = map_shared(self._copy_unfitted()._fit_restart_from_seed, train_X,
+                             seed_seq.spawn(self.restart_num), self.n_jobs)
+
+        min_energy = np.inf
+        result = dict()
+        for restart_result in results:
+            if self.is_trace:
+                print(restart_result["energy"][-1])
+            if restart_result["energy"][-1] < min_energy:
+                min_energy = restart_result["energy"][-1]
+                result = restart_result
+        self.result_ = result
+        return self
+
+    def _fit_restarts_in_batch(self, train_X: np.ndarray):
+        """
+        Run restart_num restarts together as one batched computation.
+        Every variable has the leading axis for the restarts, e.g. u_xi is R * n * K and alpha is R * K.
+        A restart which satisfies the stopping condition is removed from the batch,
+        and the one with the lowest energy is kept in the same manner as the sequential restarts.
+        The initial values are the same as _fit_restarts_in_parallel, so both give the same result.
+
+        Inherited class has to implement the followings:
+            1. _init_batch_state(train_X, rngs): initial state of the iteration, dictionary of arrays with leading axis R.
+            2. _update_batch_state(train_X, state): one iteration, it returns dictionary of the estimated values
+            with the leading axis (alpha, beta, m, gamma, delta, h_xi, u_xi, ...).
+            3. _make_result(est_params): dictionary of result_ from the estimated values of one restart.
+        """
+        seed_seq = np.random.SeedSequence(
+            self.learning_seed if self.learning_seed > 0 else None)
+        rngs = [np.random.default_rng(seed)
+                for seed in seed_seq.spawn(self.restart_num)]
+        state = self._init_batch_state(train_X, rngs)
+
+        # restart id of each row of the batch.
+        active = np.arange(self.restart_num)
+        energy = np.zeros(
+            (self.restart_num, np.floor(self.iteration / self.step).astype(int)))
+        calc_ind = 0
+
+        min_energy = np.inf
+        min_restart = self.restart_num
+        result = dict()
+
+        def calc_obj_func(est_params: dict, r: int):
+            return self._calc_obj_func(**{"est_" + key: value[r] for (key, value) in est_params.items()})
+
+        for ite in range(self.iteration):
+            est_params = self._update_batch_state(train_X, state)
+
+            # restart_energy of finished restarts in this iteration
+            finished = dict()
+            if ite % self.step == 0:
+                for r in range(len(active)):
+                    energy[active[r], calc_ind] = calc_obj_func(est_params, r)
+                    if self.is_trace:
+                        print(energy[active[r], calc_ind])
+                    if calc_ind > 0 and np.abs(energy[active[r], calc_ind] - energy[active[r], calc_ind - 1]) < self.tol:
+                        finished[r] = energy[active[r], :calc_ind].copy()
+                        finished[r][-1] = energy[active[r], calc_ind]
+                calc_ind += 1
+            if ite == self.iteration - 1:
+                for r in range(len(active)):
+                    if r not in finished:
+                        finished[r] = energy[active[r]].copy()
+                        finished[r][-1] = calc_obj_func(est_params, r)
+
+            for (r, restart_energy) in finished.items():
+                if self.is_trace:
+                    print(restart_energy[-1])
+                if restart_energy[-1] < min_energy or (restart_energy[-1] == min_energy and active[r] < min_restart):
+                    min_energy = restart_energy[-1]
+                    min_restart = active[r]
+                    result = self._make_result(
+                        dict({key: value[r].copy() for (key, value) in est_params.items()}, energy=restart_energy))
+
+            if len(finished) > 0:
+                is_running = np.ones(len(active), dtype=bool)
+                is_running[list(finished.keys())] = False
+                active = active[is_running]
+                state = {key: value[is_running]
+                         for (key, value) in state.items()}
+                if len(active) == 0:
+                    break
+        self.result_ = result
+        return self
+
+    def _fit_restart_squarem(self, train_X: np.ndarray, params: dict, latent: dict) -> dict:
+        """
+        Accelerate the iteration by SQUAREM (Varadhan and Roland, 2008).
+        Let F be one update of the algorithm as a map of the posterior distribution of the parameter theta,
+        where alpha, beta, gamma, delta are in log scale and m is as it is.
+        One cycle evaluates theta_1 = F(theta_0), theta_2 = F(theta_1), and extrapolates them:
+            # r = theta_1 - theta_0, v = theta_2 - 2 theta_1 + theta_0, a = min(-|r|/|v|, -1)
+            # theta' = theta_0 - 2 a r + a^2 v
+        The energy is valid only for theta given by the update from some latent variables, which theta' is not.
+        So one plain step theta'' = F(theta') is taken, and theta'' is accepted when its energy is not larger than that at theta_1,
+        otherwise the cycle falls back to theta_2, i.e. the plain steps. Hence the recorded energy never increases.
+        iteration bounds the number of evaluations of F.
+
+        + Input:
+            1. train_X: input data.
+            2. params: initial value, dictionary of alpha, beta, m, gamma and delta.
+            3. latent: latent variables from which params is updated, e.g. u_xi.
+
+        + Output:
+            dictionary of the estimated values for _make_result, energy has the value of each cycle.
+
+        Inherited class has to implement _vb_map(train_X, params, latent), which returns
+        the estimated values at params including the energy and the latent variables, and F(params).
+        The energy is calculated only when latent, from which params is updated, is given.
+        """
+        keys = list(params.keys())
+        shapes = [np.shape(params[key]) for key in keys]
+
+        def to_vector(params: dict) -> np.ndarray:
+            return np.concatenate([np.ravel(params[key] if key == "m" else np.log(params[key])) for key in keys])
+
+        def to_params(vector: np.ndarray) -> dict:
+            values = np.split(vector, np.cumsum([np.prod(shape, dtype=int)
+                                                 for shape in shapes])[:-1])
+            return {key: (value if key == "m" else np.exp(value)).reshape(shape) for (key, value, shape) in zip(keys, values, shapes)}
+
+        (est_params, next_params) = self._vb_map(train_X, params, latent)
+        energy = [est_params["energy"]]
+        map_num = 1
+        while map_num + 3 <= self.iteration:
+            theta0 = to_vector(params)
+            theta1 = to_vector(next_params)
+            (est_params1, params2) = self._vb_map(
+                train_X, next_params, est_params)
+            theta2 = to_vector(params2)
+
+            r = theta1 - theta0
+            v = theta2 - 2 * theta1 + theta0
+            norm_v = np.sqrt(v @ v)
+            step_length = min(-np.sqrt(r @ r) / norm_v, -1) if norm_v > 0 else -1
+            # One plain step stabilizes theta', and the energy is evaluated at the result.
+            (stabilizing_params, params) = self._vb_map(train_X, to_params(
+                theta0 - 2 * step_length * r + step_length**2 * v))
+            (new_est_params, new_next_params) = self._vb_map(
+                train_X, params, stabilizing_params)
+            map_num += 3
+            if not new_est_params["energy"] <= est_params1["energy"]:
+                # Fall back to the plain steps.
+                params = params2
+                (new_est_params, new_next_params) = self._vb_map(
+                    train_X, params, est_params1)
+                map_num += 1
+            (est_params, next_params) = (new_est_params, new_next_params)
+
+            energy.append(est_params["energy"])
+            if self.is_trace:
+                print(energy[-1])
+            if np.abs(energy[-1] - energy[-2]) < self.tol:
+                break
+        est_params["energy"] = np.array(energy)
+        return est_params
+
+    def _prune_latent_variables(self, est_u_xi: np.ndarray):
+        """
+        Find collapsed components, whose expected number of data sum_{i=1}^n u_{ik}(xi) is less than prune_threshold.
+
+        + Input:
+            1. est_u_xi: n * K posterior distribution of latent variable.
+
+        + Output:
+            1. keep: boolean mask of the surviving components, None if no component is removed.
+            2. est_u_xi: n * K' u_xi of the surviving components, normalized again.
+        """
+        if self.prune_threshold is None:
+            return (None, est_u_xi)
+        keep = est_u_xi.sum(axis=0) >= self.prune_threshold
+        if keep.all() or not keep.any():
+            return (None, est_u_xi)
+        est_u_xi = est_u_xi[:, keep]
+        norm_u_xi = est_u_xi.sum(axis=1)
+        est_u_xi[norm_u_xi == 0, :] = 1
+        est_u_xi /= est_u_xi.sum(axis=1)[:, np.newaxis]
+        return (keep, est_u_xi)
+
+    def fit_K_sweep(self, train_X: np.ndarray, K_list: list, patience: int = 1):
+        """
+        Select the number of components K by the energy (-ELBO) of VB.
+        K_list is processed in ascending order by waves of n_jobs values, and each K in a wave is fitted from scratch in parallel.
+        After that, each K is fitted again from the solution of the previous K in K_list by splitting components,
+        and the better one is kept. The sweep stops when the lowest energy is not improved by the last patience values of K.
+        Finally, each K is also tried from the solution of the next K by merging components.
+
+        + Input:
+            1. train_X: input data.
+            2. K_list: candidates of K.
+            3. patience: number of K values without improvement of the energy to stop the sweep.
+
+        + Output:
+            + K and result_ are set to those of the lowest energy.
+            + K_sweep_: dictionary of the table of the fitted K values:
+                1. K: value of K.
+                2. energy: final energy of the fit.
+                3. init: initial value giving the energy, "scratch", "split" or "merge".
+        """
+        K_list = np.sort(np.unique(K_list))
+        n_jobs = 1 if self.n_jobs is None else (
+            os.cpu_count() if self.n_jobs < 0 else self.n_jobs)
+        results = []
+        inits = []
+
+        for start in range(0, len(K_list), n_jobs):
+            wave = list(K_list[start:start + n_jobs])
+            results += map_shared(self._copy_unfitted()._fit_K_from_scratch,
+                                  train_X, wave, self.n_jobs or 1)
+            inits += ["scratch"] * len(wave)
+            for i in range(max(start, 1), len(results)):
+                warm_result = self._fit_K_from_neighbour(
+                    train_X, K_list[i], results[i - 1])
+                if warm_result["energy"][-1] < results[i]["energy"][-1]:
+                    (results[i], inits[i]) = (warm_result, "split")
+            energy = np.array([result["energy"][-1] for result in results])
+            if np.argmin(energy) < len(results) - patience:
+                break
+
+        for i in range(len(results) - 2, -1, -1):
+            warm_result = self._fit_K_from_neighbour(
+                train_X, K_list[i], results[i + 1])
+            if warm_result["energy"][-1] < results[i]["energy"][-1]:
+                (results[i], inits[i]) = (warm_result, "merge")
+
+        energy = np.array([result["energy"][-1] for result in results])
+        if self.is_trace:
+            print(np.array([K_list[:len(results)], energy]).T)
+        self.K_sweep_ = {"K": K_list[:len(results)],
+                         "energy": energy, "init": np.array(inits)}
+        self.K = int(K_list[np.argmin(energy)])
+        self.result_ = results[np.argmin(energy)]
+        return self
+
+    def _copy_unfitted(self):
+        """
+        Shallow copy of this estimator without the fitted attributes such as result_
+        and the cache of _calc_log_complete_likelihood, which refers to result_,
+        so it is pickled to the processes of map_shared instead of this estimator.
+        """
+        estimator = copy.copy(self)
+        for key in [key for key in vars(estimator)
+                    if (key.endswith("_") and not key.startswith("_")) or key == "_scoring_params"]:
+            delattr(estimator, key)
+        return estimator
+
+    def _copy_with_K(self, K: int):
+        """
+        Copy of this estimator with K components, the restarts run in the process of the copy.
+        """
+        estimator = copy.copy(self)
+        estimator.K = int(K)
+        if self.n_jobs is not None:
+            estimator.n_jobs = 1
+        return estimator
+
+    def _fit_K_from_scratch(self, train_X: np.ndarray, K: int) -> dict:
+        """
+        Fit with K components in the same manner as fit, used by fit_K_sweep.
+        """
+        return self._copy_with_K(K).fit(train_X).result_
+
+    def _fit_K_from_neighbour(self, train_X: np.ndarray, K: int, result: dict) -> dict:
+        """
+        Fit with K components from the latent variables of result, used by fit_K_sweep.
+        While the number of components of result is less (larger) than K,
+        the component with the largest (smallest) ratio is split (merged into the nearest one).
+        A component is split into two by the sign of x_{ij} - m_{kj}, where j is the dimension with the largest variance.
+        Every latent variable (u_xi and auxiliary variables such as g_eta) has the components on axis 1.
+        """
+        latent = {key: result[key].copy()
+                  for key in ["u_xi", "g_eta"] if key in result}
+        est_mean = result["mean"]
+        est_ratio = result["ratio"]
+
+        while latent["u_xi"].shape[1] < K:
+            k = np.argmax(est_ratio)
+            est_u_xi = latent["u_xi"][:, k]
+            var = est_u_xi @ (train_X - est_mean[k])**2 / est_u_xi.sum()
+            is_upper = train_X[:, np.argmax(var)] > est_mean[k, np.argmax(var)]
+            for (key, value) in latent.items():
+                new_value = value[:, k:k + 1].copy()
+                if key == "u_xi":
+                    value[:, k] *= ~is_upper
+                    new_value[:, 0] *= is_upper
+                latent[key] = np.concatenate([value, new_value], axis=1)
+            est_mean = np.vstack([est_mean, est_mean[k]])
+            est_ratio = np.append(est_ratio, est_ratio[k] / 2)
+            est_ratio[k] /= 2
+
+        while latent["u_xi"].shape[1] > K:
+            k = np.argmin(est_ratio)
+            dist = ((est_mean - est_mean[k])**2).sum(axis=1)
+            dist[k] = np.inf
+            l = np.argmin(dist)
+            is_k = latent["u_xi"][:, k] > latent["u_xi"][:, l]
+            for (key, value) in latent.items():
+                if key == "u_xi":
+                    value[:, l] += value[:, k]
+                else:
+                    value[is_k, l] = value[is_k, k]
+            latent = {key: np.delete(value, k, axis=1)
+                      for (key, value) in latent.items()}
+            est_ratio[l] += est_ratio[k]
+            est_ratio = np.delete(est_ratio, k)
+            est_mean = np.delete(est_mean, k, axis=0)
+
+        return self._copy_with_K(K)._fit_restart_from_latent(train_X, latent)
+
     def predict_logproba(self, test_X: np.ndarray):
         """
         Calculate log value of predictive distribution.
         Difference among each implemented class is _logpdf, this method is commonized.
         """
+        return self.score_samples(test_X).sum()
+
+    def score_samples(self, test_X: np.ndarray) -> np.ndarray:
+        """
+        Log value of predictive distribution of each data, log sum_k a_k p(x_i|b_k, s_k).
+        """
+        log_complete_likelihood = self._calc_log_complete_likelihood(test_X)
+        max_log_complete_likelihood = log_complete_likelihood.max(axis=1)
+        return np.log(np.exp(log_complete_likelihood - max_log_complete_likelihood[:, np.newaxis]).sum(axis=1)) + max_log_complete_likelihood
+
+    def predict_proba(self, test_X: np.ndarray) -> np.ndarray:
+        """
+        n * K posterior probability of the component of each data.
+        """
+        log_complete_likelihood = self._calc_log_complete_likelihood(test_X)
+        proba = np.exp(log_complete_likelihood -
+                       log_complete_likelihood.max(axis=1)[:, np.newaxis])
+        proba /= proba.sum(axis=1)[:, np.newaxis]
+        return proba
+
+    def predict(self, test_X: np.ndarray) -> np.ndarray:
+        """
+        Component with the largest posterior probability of each data.
+        """
+        return np.argmax(self._calc_log_complete_likelihood(test_X), axis=1)
 
+    def _calc_log_complete_likelihood(self, test_X: np.ndarray) -> np.ndarray:
+        """
+        n * K matrix of log a_k + log p(x_i|b_k, s_k).
+        The constants of each component are calculated once for result_ by _calc_scoring_params and cached.
+        """
         check_is_fitted(self, "result_")
-        n = test_X.shape[0]
-        loglik = np.zeros((n, self.K))
-        for k in range(self.K):
-            if self.result_["precision"].ndim == 2:
-                loglik[:, k] = np.log(self.result_["ratio"][k]) + self._logpdf(
-                    test_X, self.result_["mean"][k, :],  np.diag(self.result_["precision"][k, :]))
-            elif self.result_["precision"].ndim == 3:
-                loglik[:, k] = np.log(self.result_["ratio"][k]) + self._logpdf(
-                    test_X, self.result_["mean"][k, :],  self.result_["precision"][:, :, k])
-            else:
-                raise ValueError(
-                    "Error precision, dimension of precision must be 2 or 3!")
-        max_loglik = loglik.max(axis=1)
-        norm_loglik = loglik - np.repeat(max_loglik, self.K).reshape(n, self.K)
-        return (np.log(np.exp(norm_loglik).sum(axis=1)) + max_loglik).sum()
+        scoring_params = getattr(self, "_scoring_params", None)
+        if scoring_params is None or scoring_params["result"] is not self.result_:
+            scoring_params = dict(self._calc_scoring_params(), result=self.result_,
+                                  log_ratio=np.log(self.result_["ratio"]))
+            self._scoring_params = scoring_params
+        return scoring_params["log_ratio"] + self._calc_component_logpdf(test_X, scoring_params)
+
+    def _calc_scoring_params(self) -> dict:
+        """
+        Constants of each component used by _calc_component_logpdf.
+        Inherited class overrides this method together with _calc_component_logpdf.
+        """
+        return dict()
+
+    def compile_predictor(self, max_bytes: int = 2**27):
+        """
+        Freeze the fitted result_ into MixturePredictor, which scores new data without looking up result_.
+
+        + Input:
+            1. max_bytes: bound of the memory of the intermediate n * K * M arrays of the batch path.
+        """
+        check_is_fitted(self, "result_")
+        scoring_params = self._calc_scoring_params()
+        if len(scoring_params) == 0:
+            raise ValueError(
+                "compile_predictor needs _calc_scoring_params and _calc_component_logpdf of " + type(self).__name__ + ".")
+        return MixturePredictor(np.log(self.result_["ratio"]), self.result_["mean"].shape[1], scoring_params,
+                                type(self)._calc_component_logpdf, max_bytes)
+
+    def _calc_component_logpdf(self, test_X: np.ndarray, scoring_params: dict) -> np.ndarray:
+        """
+        n * K matrix of log p(x_i|b_k, s_k), this is calculated by _logpdf of each component unless it is overridden.
+        An override does not depend on the instance but only on scoring_params, so it is a staticmethod used by compile_predictor.
+        """
+        K = len(self.result_["ratio"])
+        if self.result_["precision"].ndim == 2:
+            return np.array([self._logpdf(test_X, self.result_["mean"][k, :], np.diag(self.result_["precision"][k, :])) for k in range(K)]).T
+        elif self.result_["precision"].ndim == 3:
+            return np.array([self._logpdf(test_X, self.result_["mean"][k, :], self.result_["precision"][:, :, k]) for k in range(K)]).T
+        else:
+            raise ValueError(
+                "Error precision, dimension of precision must be 2 or 3!")
 
     def score_clustering(self, true_label_arg: np.ndarray):
         """
         Score the clustering distribution by 0-1 loss.
         Since label has degree to change the value itself,
         this function chooses the most fitted permutation.
+        The number of correct labels of a permutation is a sum of the elements of the K * K confusion matrix,
+        so the best one is given by the linear assignment problem in O(K^3) instead of K! permutations.
 
         + Input:
             1. true_label_arg: label of true distribution
@@ -99,58 +491,156 @@ class AbstractMixtureModel(metaclass=ABCMeta):
         check_is_fitted(self, "result_")
         K = len(self.result_["ratio"])
 
-        est_label_prob = self.result_["u_xi"]
-        target_label_arg = true_label_arg
-        est_label_arg = np.argmax(est_label_prob, axis=1)
+        est_label_arg = np.argmax(self.result_["u_xi"], axis=1)
 
-        target_label_arg = true_label_arg
+        # confusion[i, l]: number of data whose estimated label is i and true label is l.
+        # A true label larger than K - 1 is never matched in the same manner as the permutations of range(K).
+        is_matchable = true_label_arg < K
+        confusion = np.bincount(est_label_arg[is_matchable] * K + true_label_arg[is_matchable],
+                                minlength=K * K).reshape(K, K)
+        (_, max_perm) = linear_sum_assignment(confusion, maximize=True)
 
-        max_correct_num = 0
-        for perm in list(itertools.permutations(range(K), K)):
-            permed_est_label_arg = est_label_arg.copy()
-            for i in range(len(perm)):
-                permed_est_label_arg[est_label_arg == i] = perm[i]
-            correct_num = (permed_est_label_arg == target_label_arg).sum()
-            if correct_num > max_correct_num:
-                max_correct_num = correct_num
-                max_perm = perm
-                max_est_label_arg = permed_est_label_arg
-        return (max_correct_num, max_perm, max_est_label_arg)
+        max_correct_num = confusion[np.arange(K), max_perm].sum()
+        max_est_label_arg = max_perm[est_label_arg]
+        return (max_correct_num, tuple(max_perm.tolist()), max_est_label_arg)
 
     def score_latent_kl(self, true_logp: np.ndarray):
         """
         Calculate the value of negative log posterior distribution of latent varialble -log(p(z|x,w)).
+        The KL divergence sum_i sum_l p_{il} (log p_{il} - log q_{i perm^{-1}(l)}) of a permutation is a sum of per-pair terms,
+        so the K * K0 cost matrix is calculated by one n * K pass and the best permutation is given by the linear assignment problem.
+
+        + Input:
+            1. true_logp: n * K0 log posterior distribution of latent variable of the true distribution.
+
+        + Output:
+            1. min_kl: KL divergence of the best permutation.
+            Note: When K < K0, some true component is not matched, and min_kl is inf unless its probability is zero.
+            2. min_perm: permutation of the estimated components, the k-th component corresponds to the perm[k]-th true one.
+            Note: When K > K0, the components which are not matched correspond to K0, ..., K-1 in the order of their index.
+            3. min_log_pred_p: n * max(K, K0) estimated log posterior distribution ordered by min_perm,
+            whose column without estimated component is -inf.
         """
         check_is_fitted(self, "result_")
         log_complete_likelihood = self.result_["h_xi"]
         (n, K) = log_complete_likelihood.shape
-        min_K = np.array([K, true_logp.shape[1]]).min()
+        K0 = true_logp.shape[1]
 
         max_log_complete_likelihood = log_complete_likelihood.max(axis=1)
         norm_log_complete_likelihood = log_complete_likelihood - \
-            np.repeat(max_log_complete_likelihood, K).reshape(n, K)
+            max_log_complete_likelihood[:, np.newaxis]
         log_pred_p = norm_log_complete_likelihood - \
-            np.log(np.repeat(np.exp(norm_log_complete_likelihood).sum(
-                axis=1), K).reshape(n, K))
-
-        min_kl = np.inf
-        min_perm = -1
-        min_log_pred_p = -1
-        for perm in list(itertools.permutations(range(K), K)):
-            permed_log_pred_p = log_pred_p.copy()
-            for i in range(len(perm)):
-                permed_log_pred_p[:, perm[i]] = log_pred_p[:, i]
-            cluster_kl = (np.exp(
-                true_logp[:, :min_K]) * (true_logp[:, :min_K] - permed_log_pred_p[:, :min_K])).sum()
-            if cluster_kl < min_kl:
-                min_kl = cluster_kl
-                min_perm = perm
-                min_log_pred_p = permed_log_pred_p
-        return (min_kl, min_perm, min_log_pred_p)
+            np.log(np.exp(norm_log_complete_likelihood).sum(axis=1))[:, np.newaxis]
+
+        # cost[k, l] = sum_i p_{il} (log p_{il} - log q_{ik})
+        true_p = np.exp(true_logp)
+        cost = (true_p * true_logp).sum(axis=0) - log_pred_p.T @ true_p
+        (est_ind, true_ind) = linear_sum_assignment(cost)
+
+        min_perm = np.empty(K, dtype=int)
+        min_perm[est_ind] = true_ind
+        min_perm[np.setdiff1d(np.arange(K), est_ind)] = np.arange(K0, K)
+        min_kl = cost[est_ind, true_ind].sum()
+        if (true_p[:, np.setdiff1d(np.arange(K0), true_ind)] > 0).any():
+            min_kl = np.inf
+
+        min_log_pred_p = np.full((n, max(K, K0)), -np.inf)
+        min_log_pred_p[:, min_perm] = log_pred_p
+        return (min_kl, tuple(min_perm), min_log_pred_p)
 
     pass
 
 
+class MixturePredictor(object):
+    """
+    Immutable predictor of a fitted mixture model made by AbstractMixtureModel.compile_predictor.
+    Constants of each component are kept as read-only contiguous arrays, so each call only evaluates
+    the n * K matrix of log a_k + log p(x_i|w_k) by the component_logpdf of the estimator.
+    + score_one and predict_one are the fast path for a single data x in mathbb{R}^M.
+    + score_samples and predict process the data by chunks of chunk_size rows,
+    where chunk_size is chosen so that the n * K * M intermediate array of a chunk is less than max_bytes.
+    """
+    __slots__ = ["log_ratio", "n_features", "scoring_params",
+                 "component_logpdf", "chunk_size"]
+
+    def __init__(self, log_ratio: np.ndarray, n_features: int, scoring_params: dict, component_logpdf, max_bytes: int = 2**27):
+        def freeze(value):
+            value = np.ascontiguousarray(value, dtype=np.float64)
+            value.flags.writeable = False
+            return value
+
+        object.__setattr__(self, "log_ratio", freeze(log_ratio))
+        object.__setattr__(self, "n_features", n_features)
+        object.__setattr__(self, "scoring_params", types.MappingProxyType(
+            {key: freeze(value) for (key, value) in scoring_params.items()}))
+        object.__setattr__(self, "component_logpdf", component_logpdf)
+        object.__setattr__(self, "chunk_size", max(
+            1, max_bytes // (8 * len(log_ratio) * n_features)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MixturePredictor is immutable.")
+
+    def __reduce__(self):
+        return (_make_mixture_predictor, (self.log_ratio, self.n_features, dict(self.scoring_params),
+                                          self.component_logpdf, 8 * len(self.log_ratio) * self.n_features * self.chunk_size))
+
+    def _log_complete_likelihood(self, X: np.ndarray) -> np.ndarray:
+        return self.log_ratio + self.component_logpdf(X, self.scoring_params)
+
+    def score_one(self, x: np.ndarray) -> float:
+        """
+        Log value of predictive distribution of one data x.
+        """
+        log_complete_likelihood = self._log_complete_likelihood(
+            x.reshape(1, -1))[0]
+        max_log_complete_likelihood = log_complete_likelihood.max()
+        return math.log(np.exp(log_complete_likelihood - max_log_complete_likelihood).sum()) + max_log_complete_likelihood
+
+    def predict_one(self, x: np.ndarray) -> int:
+        """
+        Component with the largest posterior probability of one data x.
+        """
+        return int(np.argmax(self._log_complete_likelihood(x.reshape(1, -1))[0]))
+
+    def score_samples(self, X: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Log value of predictive distribution of each data.
+
+        + Input:
+            1. X: n * M data, np.memmap is read chunk by chunk.
+            2. out: n array to store the values, e.g. np.memmap, a new array is allocated if it is None.
+        """
+        n = X.shape[0]
+        if out is None:
+            out = np.empty(n)
+        for start in range(0, n, self.chunk_size):
+            log_complete_likelihood = self._log_complete_likelihood(
+                np.asarray(X[start:start + self.chunk_size]))
+            max_log_complete_likelihood = log_complete_likelihood.max(axis=1)
+            out[start:start + self.chunk_size] = np.log(np.exp(
+                log_complete_likelihood - max_log_complete_likelihood[:, np.newaxis]).sum(axis=1)) + max_log_complete_likelihood
+        return out
+
+    def predict(self, X: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Component with the largest posterior probability of each data, computed in the same manner as score_samples.
+        """
+        n = X.shape[0]
+        if out is None:
+            out = np.empty(n, dtype=int)
+        for start in range(0, n, self.chunk_size):
+            out[start:start + self.chunk_size] = np.argmax(self._log_complete_likelihood(
+                np.asarray(X[start:start + self.chunk_size])), axis=1)
+        return out
+
+
+def _make_mixture_predictor(log_ratio, n_features, scoring_params, component_logpdf, max_bytes):
+    """
+    Unpickle MixturePredictor.
+    """
+    return MixturePredictor(log_ratio, n_features, scoring_params, component_logpdf, max_bytes)
+
+
 class GaussianMixtureModelVB(AbstractMixtureModel, DensityMixin, BaseEstimator):
     """
     Gaussian Mixture with Variational Bayes.
@@ -160,7 +650,8 @@ class GaussianMixtureModelVB(AbstractMixtureModel, DensityMixin, BaseEstimator):
     def __init__(self, K: int = 3,
                  pri_alpha: float = 0.1, pri_beta: float = 0.001, pri_gamma: float = 2, pri_delta: float = 2,
                  iteration: int = 1000, restart_num: int = 5, learning_seed: int = -1, method="diag",
-                 tol: float = 1e-5, step: int = 20, is_trace=False):
+                 tol: float = 1e-5, step: int = 20, is_trace=False, n_jobs: int = None, batch_restarts: bool = False,
+                 acceleration: str = None, prune_threshold: float = None, dtype: type = np.float64):
         """
         Initialize the following parameters:
         1. pri_alpha: hyperparameter for prior distribution of symmetric Dirichlet distribution.
@@ -172,8 +663,24 @@ class GaussianMixtureModelVB(AbstractMixtureModel, DensityMixin, BaseEstimator):
         7. learning_seed: Seed for initial values.
         8. tol: tolerance to stop the algorithm
         9. step: interval to calculate the objective function
-            Note: Since evaluating the objective function is a little bit heavy (roughly it may have O(n*M*K)),
-            so by this parameter we avoid watching the value every time.
+            Note: The objective function of fit reuses the values calculated in the update, so it costs O(n*K) rather than O(n*M*K),
+            and step=1 checks the convergence every iteration at little cost.
+        10. n_jobs: Number of processes to run the restarts in parallel, -1 means the number of cpus.
+            Note: When n_jobs is None, restarts run in this process with the global seed of numpy as before.
+            Otherwise, each restart uses its own np.random.Generator derived from learning_seed,
+            and the result is same for any n_jobs.
+        11. batch_restarts: If True, all the restarts run together as one batched computation (only for method="diag").
+            Note: This is efficient for small or medium n, where starting processes costs more than the fit itself.
+            The initial values are same as those of n_jobs, so the result is same as the case of n_jobs.
+        12. acceleration: "squarem" accelerates the iteration by SQUAREM (only for method="diag"), None means the plain iteration.
+            Note: In this case energy is recorded every SQUAREM cycle, and step is not used.
+        13. prune_threshold: component whose expected number of data sum_i u_{ik} is less than this value is removed during fit,
+            None means no component is removed.
+            Note: Original index of each surviving component is stored in result_["active_components"].
+            Since the number of components differs among restarts, it can not be used with batch_restarts or acceleration.
+        14. dtype: precision of the n * K variables (h_xi and u_xi) and the products with the data for method="diag".
+            Note: np.float32 halves the memory traffic of the iteration.
+            The posterior distribution of the parameter is accumulated in float64 and the energy is also float64.
         """
         self.K = K
         self.pri_alpha = pri_alpha
@@ -187,9 +694,20 @@ class GaussianMixtureModelVB(AbstractMixtureModel, DensityMixin, BaseEstimator):
         self.tol = tol
         self.step = step
         self.is_trace = is_trace
+        self.n_jobs = n_jobs
+        self.batch_restarts = batch_restarts
+        self.acceleration = acceleration
+        self.prune_threshold = prune_threshold
+        self.dtype = dtype
         pass
 
     def fit(self, train_X: np.ndarray, y: np.ndarray = None):
+        if self.acceleration not in (None, "squarem"):
+            raise ValueError(
+                f"acceleration must be None or \"squarem\", but {self.acceleration!r} is given.")
+        if self.acceleration is not None and self.method != "diag":
+            raise ValueError(
+                "acceleration is supported only for method=\"diag\".")
         if self.method == "diag":
             return self._fit_diag(train_X, y)
         elif self.method == "full":
@@ -207,181 +725,501 @@ class GaussianMixtureModelVB(AbstractMixtureModel, DensityMixin, BaseEstimator):
     # def _fit_single(self, train_X:np.ndarray, y:np.ndarray = None):
 
     def _fit_full(self, train_X, y: np.ndarray):
+        if self.batch_restarts:
+            raise ValueError(
+                "batch_restarts is supported only for method=\"diag\".")
+        if self.n_jobs is not None:
+            return self._fit_restarts_in_parallel(train_X)
+
         (n, M) = train_X.shape
         if self.learning_seed > 0:
             np.random.seed(self.learning_seed)
 
-        # Setting for static variable in the algorithm.
-        expand_x = np.repeat(train_X, self.K).reshape(n, M, self.K).transpose(
-            (0, 2, 1))  # n * K * M data with the same matrix among 2nd dimension
-
         min_energy = np.inf
         result = dict()
 
-        pri_Sigma = self.pri_delta * np.eye(M)
-        pri_inv_Sigma = 1 / self.pri_delta * np.eye(M)
-
         for restart in range(self.restart_num):
-
-            energy = np.zeros(np.floor(self.iteration / self.step).astype(int))
-            calc_ind = 0
             # Setting for initial value
             est_u_xi = np.random.dirichlet(alpha=np.ones(self.K), size=n)
+            restart_result = self._fit_full_restart(train_X, est_u_xi)
+            energy = restart_result["energy"]
 
-            # Start learning.
-            for ite in range(self.iteration):
-                # Update posterior distribution of parameter.
-                est_alpha = self.pri_alpha + est_u_xi.sum(axis=0)
-                est_beta = self.pri_beta + est_u_xi.sum(axis=0)
-                est_m = est_u_xi.T @ train_X / \
-                    np.repeat(est_beta, M).reshape(self.K, M)
-                est_gamma = self.pri_gamma + est_u_xi.sum(axis=0)
-                est_delta = np.array([(np.repeat(est_u_xi[:, k], M).reshape(n, M) * train_X).T @ train_X - est_m[k, :].reshape(
-                    M, 1) @ est_m[k, :].reshape(1, M) * est_beta[k] + pri_inv_Sigma for k in range(self.K)]).reshape(self.K, M, M).transpose((1, 2, 0))
-                # est_inv_delta = np.array([np.linalg.inv(est_delta[:,:,k]) for k in range(self.K)]).reshape(self.K, M,M).transpose((1,2,0))
-
-                # Update posterior distribution of latent variable
-                est_h_xi = np.zeros((n, self.K))
-                for k in range(self.K):
-                    est_g_eta = (train_X - est_m[k, :]) * np.linalg.solve(
-                        est_delta[:, :, k] / est_gamma[k], (train_X - est_m[k, :]).T).T + 1 / est_beta[k]
-                    est_h_xi[:, k] = -M / 2 * np.log(2 * np.pi) + psi(est_alpha[k]) - psi(est_alpha.sum()) - est_g_eta.sum(
-                        axis=1) / 2 + multipsi(est_gamma[k] / 2, M) / 2 + M / 2 * np.log(2) - np.linalg.slogdet(est_delta[:, :, k])[1] / 2
-                    pass
-                max_h_xi = est_h_xi.max(axis=1)
-                norm_h_xi = est_h_xi - \
-                    np.repeat(max_h_xi, self.K).reshape(n, self.K)
-                est_u_xi = np.exp(
-                    norm_h_xi) / np.repeat(np.exp(norm_h_xi).sum(axis=1), self.K).reshape(n, self.K)
-
-                # Calculate evaluation function
-                if ite % self.step == 0:
-                    # Calculate evaluation function
-                    energy[calc_ind] = -(np.log(np.exp(norm_h_xi).sum(axis=1)) +
-                                         max_h_xi).sum() + (est_u_xi * est_h_xi).sum()
-                    energy[calc_ind] += gammaln(est_alpha.sum()) - gammaln(
-                        self.K * self.pri_alpha) + (-gammaln(est_alpha) + gammaln(self.pri_alpha)).sum()
-                    energy[calc_ind] += (np.log(M *
-                                                est_beta / self.pri_beta) / 2).sum()
-                    energy[calc_ind] += (M * (self.pri_gamma - est_gamma) / 2 * np.log(2) + self.pri_gamma / 2 * np.log(M * self.pri_delta) + est_gamma / 2 * np.array(
-                        [np.linalg.slogdet(est_delta[:, :, k])[1] for k in range(self.K)]) + multigammaln(self.pri_gamma / 2, M) - multigammaln(est_gamma / 2, M)).sum()
-                    energy[calc_ind] += n * M * np.log(2 * np.pi) / 2
-                    if self.is_trace:
-                        print(energy[calc_ind])
-                    if calc_ind > 0 and np.abs(energy[calc_ind] - energy[calc_ind - 1]) < self.tol:
-                        energy = energy[:calc_ind]
-                        break
-                    calc_ind += 1
-                    pass
-                pass
             if self.is_trace:
                 print(f"{energy[-1]} \n")
             if energy[-1] < min_energy:
                 min_energy = energy[-1]
-                result["ratio"] = est_alpha / est_alpha.sum()
-                result["mean"] = est_m
-                result["scale"] = np.array([est_delta[:, :, k] / est_gamma[k]
-                                            for k in range(self.K)]).reshape(self.K, M, M).transpose((1, 2, 0))
-                result["precision"] = np.array([np.linalg.inv(result["scale"][:, :, k]) for k in range(
-                    self.K)]).reshape(self.K, M, M).transpose((1, 2, 0))
-                result["alpha"] = est_alpha
-                result["beta"] = est_beta
-                result["mu"] = est_m
-                result["gamma"] = est_gamma
-                result["delta"] = est_delta
-                result["h_xi"] = est_h_xi
-                result["u_xi"] = est_u_xi
-                result["energy"] = energy
+                result = restart_result
             pass
         self.result_ = result
+        return self
+
+    def _fit_full_restart(self, train_X: np.ndarray, est_u_xi: np.ndarray) -> dict:
+        """
+        Run the algorithm for full covariance from the initial value est_u_xi,
+        and return the estimated values in the form of result_.
+        """
+        (n, M) = train_X.shape
+        pri_inv_Sigma = 1 / self.pri_delta * np.eye(M)
+        identity = np.eye(M)
+
+        energy = np.zeros(np.floor(self.iteration / self.step).astype(int))
+        calc_ind = 0
+        active_components = np.arange(self.K)
+        # Work buffer of n * KM, shared by the weighted data and the whitened residuals.
+        work = np.empty((n, self.K * M))
+
+        # Start learning.
+        for ite in range(self.iteration):
+            (keep, est_u_xi) = self._prune_latent_variables(est_u_xi)
+            if keep is not None:
+                active_components = active_components[keep]
+            K = est_u_xi.shape[1]
+
+            # Update posterior distribution of parameter.
+            # The weighted scatter matrices of all the components are given by one GEMM of n * KM and n * M matrices.
+            sum_u_xi = est_u_xi.sum(axis=0)
+            est_alpha = self.pri_alpha + sum_u_xi
+            est_beta = self.pri_beta + sum_u_xi
+            est_m = est_u_xi.T @ train_X / est_beta[:, np.newaxis]
+            est_gamma = self.pri_gamma + sum_u_xi
+            weighted_X = work[:, :K * M].reshape(n, K, M)
+            np.multiply(est_u_xi[:, :, np.newaxis], train_X[:, np.newaxis, :], out=weighted_X)
+            est_delta = (weighted_X.reshape(n, K * M).T @ train_X).reshape(K, M, M) - \
+                est_beta[:, np.newaxis, np.newaxis] * est_m[:, :, np.newaxis] * est_m[:, np.newaxis, :] + pri_inv_Sigma
+
+            # Update posterior distribution of latent variable
+            # One batched Cholesky delta_k = L_k L_k^T gives the logdet, and L_k^{-1} gives
+            # (x_i - m_k)^T (delta_k / gamma_k)^{-1} (x_i - m_k) = gamma_k |L_k^{-1} x_i - L_k^{-1} m_k|^2 by one GEMM.
+            chol = np.linalg.cholesky(est_delta)
+            log_det_delta = 2 * np.log(np.diagonal(chol, axis1=1, axis2=2)).sum(axis=1)
+            # L_k is lower triangular, so L_k^{-1} is given by the triangular solve instead of the LU of np.linalg.solve.
+            inv_chol = np.stack([solve_triangular(chol_k, identity, lower=True, check_finite=False) for chol_k in chol])
+            y = np.matmul(train_X, inv_chol.transpose((2, 0, 1)).reshape(M, K * M), out=work[:, :K * M])
+            y -= np.einsum("klj,kj->kl", inv_chol, est_m).ravel()
+            np.square(y, out=y)
+            est_g_eta = est_gamma * y.reshape(n, K, M).sum(axis=2) + M / est_beta
+            est_h_xi = -M / 2 * np.log(2 * np.pi) + psi(est_alpha) - psi(est_alpha.sum()) - est_g_eta / 2 + \
+                multipsi(est_gamma / 2, M) / 2 + M / 2 * np.log(2) - log_det_delta / 2
+            max_h_xi = est_h_xi.max(axis=1)
+            norm_h_xi = est_h_xi - \
+                np.repeat(max_h_xi, K).reshape(n, K)
+            est_u_xi = np.exp(
+                norm_h_xi) / np.repeat(np.exp(norm_h_xi).sum(axis=1), K).reshape(n, K)
+
+            # Calculate evaluation function
+            if ite % self.step == 0:
+                # Calculate evaluation function
+                energy[calc_ind] = -(np.log(np.exp(norm_h_xi).sum(axis=1)) +
+                                     max_h_xi).sum() + (est_u_xi * est_h_xi).sum()
+                energy[calc_ind] += gammaln(est_alpha.sum()) - gammaln(
+                    K * self.pri_alpha) + (-gammaln(est_alpha) + gammaln(self.pri_alpha)).sum()
+                energy[calc_ind] += (np.log(M *
+                                            est_beta / self.pri_beta) / 2).sum()
+                energy[calc_ind] += (M * (self.pri_gamma - est_gamma) / 2 * np.log(2) + self.pri_gamma / 2 * np.log(M * self.pri_delta) + est_gamma / 2 * log_det_delta + multigammaln(self.pri_gamma / 2, M) - multigammaln(est_gamma / 2, M)).sum()
+                energy[calc_ind] += n * M * np.log(2 * np.pi) / 2
+                if self.is_trace:
+                    print(energy[calc_ind])
+                if calc_ind > 0 and np.abs(energy[calc_ind] - energy[calc_ind - 1]) < self.tol:
+                    energy = energy[:calc_ind]
+                    break
+                calc_ind += 1
+                pass
+            pass
+
+        # precision_k = gamma_k delta_k^{-1} = gamma_k L_k^{-T} L_k^{-1} reuses the last factorization.
+        return self._make_result({"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta.transpose((1, 2, 0)),
+                                  "precision": (est_gamma[:, np.newaxis, np.newaxis] * inv_chol.transpose((0, 2, 1)) @ inv_chol).transpose((1, 2, 0)),
+                                  "h_xi": est_h_xi, "u_xi": est_u_xi, "energy": energy, "active_components": active_components})
 
     def _fit_diag(self, train_X: np.ndarray, y: np.ndarray = None):
+        if self.batch_restarts and self.acceleration is not None:
+            raise ValueError(
+                "batch_restarts can not be used with acceleration.")
+        if self.prune_threshold is not None and (self.batch_restarts or self.acceleration is not None):
+            raise ValueError(
+                "prune_threshold can not be used with batch_restarts or acceleration.")
+        if self.batch_restarts:
+            return self._fit_restarts_in_batch(train_X)
+        if self.n_jobs is not None:
+            return self._fit_restarts_in_parallel(train_X)
+
         (n, M) = train_X.shape
         if self.learning_seed > 0:
             np.random.seed(self.learning_seed)
 
-        # Setting for static variable in the algorithm.
-        expand_x = np.repeat(train_X, self.K).reshape(n, M, self.K).transpose(
-            (0, 2, 1))  # n * K * M data with the same matrix among 2nd dimension
-
         min_energy = np.inf
         result = dict()
 
         for restart in range(self.restart_num):
-
-            energy = np.zeros(np.floor(self.iteration / self.step).astype(int))
-            calc_ind = 0
             # Setting for initial value
-            # est_alpha = np.random.dirichlet(alpha = np.ones(self.K), size = 1)
-            # est_m = np.random.normal(size = (self.K, M))
-            # est_gamma = np.random.gamma(shape=1, size = (self.K, M))
-            # est_delta = np.random.gamma(shape=1, size = (self.K, M))
-            # est_beta = np.random.gamma(shape=1, size=(self.K, M))
             est_u_xi = np.random.dirichlet(alpha=np.ones(self.K), size=n)
+            restart_result = self._fit_diag_restart(train_X, est_u_xi)
+            energy = restart_result["energy"]
+
+            if self.is_trace:
+                print(energy[-1])
+            if energy[-1] < min_energy:
+                min_energy = energy[-1]
+                result = restart_result
+            pass
+        self.result_ = result
+        return self
 
-            # Start learning.
-            for ite in range(self.iteration):
-                # Update posterior distribution of parameter.
-                est_alpha = self.pri_alpha + est_u_xi.sum(axis=0)
-                est_beta = np.repeat(
-                    self.pri_beta + est_u_xi.sum(axis=0), M).reshape(self.K, M)
-                est_m = est_u_xi.T @ train_X / est_beta
-                est_gamma = np.repeat(
-                    self.pri_gamma + est_u_xi.sum(axis=0) / 2, M).reshape(self.K, M)
-                est_delta = self.pri_delta + \
-                    est_u_xi.T @ (train_X**2) / 2 - est_beta / 2 * est_m**2
-
-                # Update posterior distribution of latent variable
-                est_g_eta = np.repeat(est_gamma / est_delta, n).reshape(self.K, M, n).transpose((2, 0, 1)) * (expand_x - np.repeat(
-                    est_m, n).reshape(self.K, M, n).transpose((2, 0, 1)))**2 + 1 / np.repeat(est_beta, n).reshape(self.K, M, n).transpose((2, 0, 1))
-                est_h_xi = -M / 2 * np.log(2 * np.pi) + np.repeat(psi(est_alpha) - psi(est_alpha.sum()) + (psi(
-                    est_gamma) - np.log(est_delta)).sum(axis=1) / 2, n).reshape(self.K, n).T - est_g_eta.sum(axis=2) / 2
-                max_h_xi = est_h_xi.max(axis=1)
-                norm_h_xi = est_h_xi - \
-                    np.repeat(max_h_xi, self.K).reshape(n, self.K)
-                est_u_xi = np.exp(
-                    norm_h_xi) / np.repeat(np.exp(norm_h_xi).sum(axis=1), self.K).reshape(n, self.K)
+    def _fit_diag_restart(self, train_X: np.ndarray, est_u_xi: np.ndarray) -> dict:
+        """
+        Run the algorithm for diagonal covariance from the initial value est_u_xi,
+        and return the estimated values in the form of result_.
+        """
+        if self.acceleration == "squarem":
+            return self._make_result(self._fit_restart_squarem(train_X, self._calc_diag_params(train_X, est_u_xi), {"u_xi": est_u_xi}))
+
+        energy = np.zeros(np.floor(self.iteration / self.step).astype(int))
+        calc_ind = 0
+        active_components = np.arange(self.K)
+
+        # Start learning.
+        for ite in range(self.iteration):
+            (keep, est_u_xi) = self._prune_latent_variables(est_u_xi)
+            if keep is not None:
+                active_components = active_components[keep]
+
+            # Update posterior distribution of parameter.
+            est_params = self._calc_diag_params(train_X, est_u_xi)
+            (est_alpha, est_beta, est_m, est_gamma, est_delta) = (est_params["alpha"], est_params["beta"],
+                                                                  est_params["m"], est_params["gamma"], est_params["delta"])
 
+            # Update posterior distribution of latent variable
+            (est_h_xi, est_u_xi, est_log_norm) = self._calc_diag_latent_variables(
+                train_X, est_alpha, est_beta, est_m, est_gamma, est_delta)
+
+            # Calculate evaluation function
+            if ite % self.step == 0:
                 # Calculate evaluation function
-                if ite % self.step == 0:
-                    # Calculate evaluation function
-                    energy[calc_ind] = self._calc_obj_func(
-                        est_u_xi=est_u_xi, est_h_xi=est_h_xi, est_alpha=est_alpha, est_beta=est_beta, est_gamma=est_gamma, est_delta=est_delta)
-                    if self.is_trace:
-                        print(energy[calc_ind])
-                    if calc_ind > 0 and np.abs(energy[calc_ind] - energy[calc_ind - 1]) < self.tol:
-                        energy = energy[:calc_ind]
-                        break
-                    calc_ind += 1
-                    pass
+                energy[calc_ind] = self._calc_obj_func(est_u_xi=est_u_xi, est_h_xi=est_h_xi, est_log_norm=est_log_norm,
+                                                       est_alpha=est_alpha, est_beta=est_beta, est_gamma=est_gamma, est_delta=est_delta)
+                if self.is_trace:
+                    print(energy[calc_ind])
+                if calc_ind > 0 and np.abs(energy[calc_ind] - energy[calc_ind - 1]) < self.tol:
+                    energy = energy[:calc_ind]
+                    break
+                calc_ind += 1
                 pass
-            energy[-1] = self._calc_obj_func(est_u_xi=est_u_xi, est_h_xi=est_h_xi, est_alpha=est_alpha,
-                                             est_beta=est_beta, est_gamma=est_gamma, est_delta=est_delta)
+            pass
+        energy[-1] = self._calc_obj_func(est_u_xi=est_u_xi, est_h_xi=est_h_xi, est_log_norm=est_log_norm, est_alpha=est_alpha,
+                                         est_beta=est_beta, est_gamma=est_gamma, est_delta=est_delta)
+
+        return self._make_result({"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta,
+                                  "h_xi": est_h_xi, "u_xi": est_u_xi, "energy": energy, "active_components": active_components})
+
+    def _calc_diag_params(self, train_X: np.ndarray, est_u_xi: np.ndarray) -> dict:
+        """
+        Update posterior distribution of parameter for method="diag".
+        """
+        (K, M) = (est_u_xi.shape[1], train_X.shape[1])
+        sum_u_xi = est_u_xi.sum(axis=0, dtype=np.float64)
+        est_alpha = self.pri_alpha + sum_u_xi
+        est_beta = np.repeat(
+            self.pri_beta + sum_u_xi, M).reshape(K, M)
+        est_m = est_u_xi.T @ train_X / est_beta
+        est_gamma = np.repeat(
+            self.pri_gamma + sum_u_xi / 2, M).reshape(K, M)
+        est_delta = self.pri_delta + \
+            est_u_xi.T @ (train_X**2) / 2 - est_beta / 2 * est_m**2
+        return {"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta}
+
+    def _vb_map(self, train_X: np.ndarray, params: dict, latent: dict = None):
+        """
+        One update of the algorithm as a map of the posterior distribution of the parameter, used by _fit_restart_squarem.
+        The energy is -ELBO of params and u_xi updated by params, which needs latent["u_xi"] from which params is updated:
+            # sum_i log sum_k exp(h_{ik}) is of the updated u_xi, and sum_{ik} u_{ik} h_{ik} is of latent["u_xi"].
+        It is np.nan when latent is None.
+        """
+        (est_h_xi, est_u_xi, est_log_norm) = self._calc_diag_latent_variables(
+            train_X, params["alpha"], params["beta"], params["m"], params["gamma"], params["delta"])
+        energy = np.nan if latent is None else self._calc_obj_func(
+            est_u_xi=latent["u_xi"], est_h_xi=est_h_xi, est_log_norm=est_log_norm, est_alpha=params["alpha"],
+            est_beta=params["beta"], est_gamma=params["gamma"], est_delta=params["delta"])
+        return (dict(params, h_xi=est_h_xi, u_xi=est_u_xi, energy=energy), self._calc_diag_params(train_X, est_u_xi))
+
+    def _calc_diag_latent_variables(self, train_X: np.ndarray, est_alpha: np.ndarray, est_beta: np.ndarray,
+                                    est_m: np.ndarray, est_gamma: np.ndarray, est_delta: np.ndarray):
+        """
+        Update posterior distribution of latent variable for method="diag".
+
+        + Output:
+            1. est_h_xi: n * K matrix, E_w[log p(x_i, z_i = k|w)]
+            2. est_u_xi: n * K matrix, posterior probability of latent variable.
+            3. est_log_norm: n vector, log sum_k exp(h_{ik}), the normalizer of u_xi reused by _calc_local_obj_func.
+        """
+        M = train_X.shape[1]
+        x = train_X.astype(self.dtype, copy=False)
+        # sum_j gamma_kj / delta_kj (x_ij - m_kj)^2 + 1 / beta_kj is expanded into two n * M by M * K products,
+        # so no n * K * M variable is made.
+        est_precision = est_gamma / est_delta
+        est_g_eta = (x**2) @ est_precision.T.astype(self.dtype) - \
+            2 * x @ (est_precision * est_m).T.astype(self.dtype)
+        est_c_xi = -M / 2 * np.log(2 * np.pi) + psi(est_alpha) - psi(est_alpha.sum()) + (psi(
+            est_gamma) - np.log(est_delta)).sum(axis=1) / 2 - (est_precision * est_m**2 + 1 / est_beta).sum(axis=1) / 2
+        est_h_xi = est_c_xi.astype(self.dtype) - est_g_eta / 2
+        max_h_xi = est_h_xi.max(axis=1)
+        norm_h_xi = est_h_xi - max_h_xi[:, np.newaxis]
+        est_u_xi = np.exp(norm_h_xi)
+        sum_u_xi = est_u_xi.sum(axis=1)
+        est_u_xi /= sum_u_xi[:, np.newaxis]
+        return (est_h_xi, est_u_xi, np.log(sum_u_xi) + max_h_xi)
+
+    def fit_out_of_core(self, train_X, y: np.ndarray = None, chunk_size: int = 100000):
+        """
+        Fit for method="diag" without keeping any n * K variable in memory.
+        The update of the parameter needs only the sufficient statistics
+        sum_i u_{ik}, sum_i u_{ik} x_i and sum_i u_{ik} x_i^2, so they are accumulated chunk by chunk.
+        Each iteration is one pass over the data, and the result is the same as fit except for rounding error.
+        Since the data is not kept, result_ does not have h_xi and u_xi.
+
+        + Input:
+            1. train_X: np.memmap (or array) of the input data,
+            or a function returning an iterator of n_i * M chunks, which is called once a pass.
+            2. chunk_size: number of rows of a chunk when train_X is an array.
+        """
+        if self.method != "diag":
+            raise ValueError(
+                "fit_out_of_core is supported only for method=\"diag\".")
+        if self.prune_threshold is not None or self.acceleration is not None:
+            raise ValueError(
+                "fit_out_of_core can not be used with prune_threshold or acceleration.")
+        if self.n_jobs is not None or self.batch_restarts:
+            raise ValueError(
+                "fit_out_of_core can not be used with n_jobs or batch_restarts.")
+        if callable(train_X):
+            chunks = train_X
+        else:
+            def chunks():
+                for start in range(0, train_X.shape[0], chunk_size):
+                    yield np.asarray(train_X[start:start + chunk_size])
+
+        if self.learning_seed > 0:
+            np.random.seed(self.learning_seed)
+
+        min_energy = np.inf
+        result = dict()
+
+        for restart in range(self.restart_num):
+            # Setting for initial value, drawn chunk by chunk in the same sequence as fit.
+            stats = None
+            for chunk in chunks():
+                est_u_xi = np.random.dirichlet(
+                    alpha=np.ones(self.K), size=chunk.shape[0])
+                stats = self._add_diag_stats(stats, chunk, est_u_xi)
+            restart_result = self._fit_diag_stats_restart(chunks, stats)
+            energy = restart_result["energy"]
 
             if self.is_trace:
                 print(energy[-1])
             if energy[-1] < min_energy:
                 min_energy = energy[-1]
-                result["ratio"] = est_alpha / est_alpha.sum()
-                result["mean"] = est_m
-                result["precision"] = est_gamma / est_delta
-                result["scale"] = np.array(
-                    [np.diag(est_delta[k, :] / est_gamma[k, :]) for k in range(self.K)])
-                result["alpha"] = est_alpha
-                result["beta"] = est_beta
-                result["mu"] = est_m
-                result["gamma"] = est_gamma
-                result["delta"] = est_delta
-                result["h_xi"] = est_h_xi
-                result["u_xi"] = est_u_xi
-                result["energy"] = energy
+                result = restart_result
             pass
         self.result_ = result
         return self
 
+    def _add_diag_stats(self, stats: dict, train_X: np.ndarray, est_u_xi: np.ndarray) -> dict:
+        """
+        Add the sufficient statistics of a chunk to stats, None means no chunk is added yet.
+        """
+        if stats is None:
+            M = train_X.shape[1]
+            stats = {"n": 0, "u": np.zeros(self.K), "ux": np.zeros(
+                (self.K, M)), "ux2": np.zeros((self.K, M))}
+        stats["n"] += train_X.shape[0]
+        stats["u"] += est_u_xi.sum(axis=0)
+        stats["ux"] += est_u_xi.T @ train_X
+        stats["ux2"] += est_u_xi.T @ (train_X**2)
+        return stats
+
+    def _fit_diag_stats_restart(self, chunks, stats: dict) -> dict:
+        """
+        _fit_diag_restart by the sufficient statistics, train_X is given by chunks().
+        """
+        n = stats["n"]
+        M = stats["ux"].shape[1]
+
+        energy = np.zeros(np.floor(self.iteration / self.step).astype(int))
+        calc_ind = 0
+
+        # Start learning.
+        for ite in range(self.iteration):
+            # Update posterior distribution of parameter.
+            est_alpha = self.pri_alpha + stats["u"]
+            est_beta = np.repeat(
+                self.pri_beta + stats["u"], M).reshape(self.K, M)
+            est_m = stats["ux"] / est_beta
+            est_gamma = np.repeat(
+                self.pri_gamma + stats["u"] / 2, M).reshape(self.K, M)
+            est_delta = self.pri_delta + \
+                stats["ux2"] / 2 - est_beta / 2 * est_m**2
+
+            # Update posterior distribution of latent variable chunk by chunk.
+            stats = None
+            local_energy = 0
+            for chunk in chunks():
+                (est_h_xi, est_u_xi, est_log_norm) = self._calc_diag_latent_variables(
+                    chunk, est_alpha, est_beta, est_m, est_gamma, est_delta)
+                stats = self._add_diag_stats(stats, chunk, est_u_xi)
+                local_energy += self._calc_local_obj_func(
+                    est_u_xi=est_u_xi, est_h_xi=est_h_xi, est_log_norm=est_log_norm)
+            current_energy = local_energy + self._calc_global_obj_func(
+                est_alpha=est_alpha, est_beta=est_beta, est_gamma=est_gamma, est_delta=est_delta) + n * M * np.log(2 * np.pi) / 2
+
+            # Calculate evaluation function
+            if ite % self.step == 0:
+                energy[calc_ind] = current_energy
+                if self.is_trace:
+                    print(energy[calc_ind])
+                if calc_ind > 0 and np.abs(energy[calc_ind] - energy[calc_ind - 1]) < self.tol:
+                    energy = energy[:calc_ind]
+                    break
+                calc_ind += 1
+                pass
+            pass
+        energy[-1] = current_energy
+
+        return self._make_result({"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta,
+                                  "energy": energy})
+
+    def _init_batch_state(self, train_X: np.ndarray, rngs: list) -> dict:
+        """
+        Initial value of _fit_restarts_in_batch, u_xi is drawn by each np.random.Generator of rngs.
+        """
+        n = train_X.shape[0]
+        return {"u_xi": np.array([rng.dirichlet(alpha=np.ones(self.K), size=n) for rng in rngs], dtype=self.dtype)}
+
+    def _update_batch_state(self, train_X: np.ndarray, state: dict) -> dict:
+        """
+        One iteration of _fit_diag_restart for R restarts, every variable has the leading axis R.
+        """
+        M = train_X.shape[1]
+        x = train_X.astype(self.dtype, copy=False)[np.newaxis, :, np.newaxis, :]
+        est_u_xi = state["u_xi"]
+
+        # Update posterior distribution of parameter, which is float64 for any dtype.
+        sum_u_xi = est_u_xi.sum(axis=1, dtype=np.float64)
+        est_alpha = self.pri_alpha + sum_u_xi
+        est_beta = np.repeat(
+            (self.pri_beta + sum_u_xi)[:, :, np.newaxis], M, axis=2)
+        est_m = np.matmul(est_u_xi.transpose((0, 2, 1)), train_X) / est_beta
+        est_gamma = np.repeat(
+            (self.pri_gamma + sum_u_xi / 2)[:, :, np.newaxis], M, axis=2)
+        est_delta = self.pri_delta + \
+            np.matmul(est_u_xi.transpose((0, 2, 1)), train_X**2) / \
+            2 - est_beta / 2 * est_m**2
+
+        # Update posterior distribution of latent variable
+        est_g_eta = (est_gamma / est_delta).astype(self.dtype)[:, np.newaxis] * (x - est_m.astype(self.dtype)[:, np.newaxis])**2 + \
+            (1 / est_beta).astype(self.dtype)[:, np.newaxis]
+        est_h_xi = (-M / 2 * np.log(2 * np.pi) + psi(est_alpha) - psi(est_alpha.sum(axis=1))[:, np.newaxis] + (psi(
+            est_gamma) - np.log(est_delta)).sum(axis=2) / 2).astype(self.dtype)[:, np.newaxis, :] - est_g_eta.sum(axis=3) / 2
+        max_h_xi = est_h_xi.max(axis=2)
+        est_u_xi = np.exp(est_h_xi - max_h_xi[:, :, np.newaxis])
+        est_u_xi /= est_u_xi.sum(axis=2)[:, :, np.newaxis]
+        state["u_xi"] = est_u_xi
+
+        return {"alpha": est_alpha, "beta": est_beta, "m": est_m, "gamma": est_gamma, "delta": est_delta,
+                "h_xi": est_h_xi, "u_xi": est_u_xi}
+
+    def _make_result(self, est_params: dict) -> dict:
+        """
+        Convert the estimated values of one restart into the form of result_.
+        """
+        est_alpha = est_params["alpha"]
+        est_gamma = est_params["gamma"]
+        est_delta = est_params["delta"]
+        K = len(est_alpha)
+
+        result = dict()
+        result["ratio"] = est_alpha / est_alpha.sum()
+        result["mean"] = est_params["m"]
+        if self.method == "diag":
+            result["precision"] = est_gamma / est_delta
+            result["scale"] = np.array(
+                [np.diag(est_delta[k, :] / est_gamma[k, :]) for k in range(K)])
+        else:
+            result["scale"] = est_delta / est_gamma
+            result["precision"] = est_params["precision"] if "precision" in est_params else \
+                np.linalg.inv(result["scale"].transpose((2, 0, 1))).transpose((1, 2, 0))
+        result["alpha"] = est_alpha
+        result["beta"] = est_params["beta"]
+        result["mu"] = est_params["m"]
+        result["gamma"] = est_gamma
+        result["delta"] = est_delta
+        result["energy"] = est_params["energy"]
+        result["active_components"] = est_params.get(
+            "active_components", np.arange(K))
+        # Latent variables are not kept by fit_out_of_core.
+        for key in ["h_xi", "u_xi"]:
+            if key in est_params:
+                result[key] = est_params[key]
+        return result
+
+    def _fit_restart_from_seed(self, train_X: np.ndarray, seed: np.random.SeedSequence) -> dict:
+        """
+        One restart for _fit_restarts_in_parallel, the initial value is drawn by np.random.Generator of seed.
+        """
+        rng = np.random.default_rng(seed)
+        est_u_xi = rng.dirichlet(alpha=np.ones(self.K), size=train_X.shape[0])
+        if self.method == "diag":
+            return self._fit_diag_restart(train_X, est_u_xi)
+        else:
+            return self._fit_full_restart(train_X, est_u_xi)
+
+    def _fit_restart_from_latent(self, train_X: np.ndarray, latent: dict) -> dict:
+        """
+        One restart from the initial value latent["u_xi"], used by fit_K_sweep.
+        """
+        if self.method == "diag":
+            return self._fit_diag_restart(train_X, latent["u_xi"])
+        else:
+            return self._fit_full_restart(train_X, latent["u_xi"])
+
     def _logpdf(self, x: np.ndarray, mean: np.ndarray, precision: np.ndarray) -> np.ndarray:
         return multivariate_normal.logpdf(x, mean, cov=np.linalg.inv(precision))
 
+    def _calc_scoring_params(self) -> dict:
+        """
+        Constants of each component for _calc_component_logpdf.
+        Diagonal precision s_k gives const_k = sum_j log s_{kj} / 2 - s_{kj} m_{kj}^2 / 2 - M log(2 pi) / 2,
+        and full precision S_k = L_k L_k^T gives the Cholesky factor L_k and const_k = sum_j log L_{kjj} - M log(2 pi) / 2.
+        """
+        precision = self.result_["precision"]
+        mean = self.result_["mean"]
+        M = mean.shape[1]
+        if precision.ndim == 2:
+            return {"precision": precision, "precision_mean": precision * mean,
+                    "const": (np.log(precision) - precision * mean**2).sum(axis=1) / 2 - M * np.log(2 * np.pi) / 2}
+        elif precision.ndim == 3:
+            K = precision.shape[2]
+            chol = np.linalg.cholesky(precision.transpose((2, 0, 1)))
+            return {"chol": np.ascontiguousarray(chol.transpose((1, 0, 2)).reshape(M, K * M)),
+                    "chol_mean": np.einsum("km,kml->kl", mean, chol).ravel(),
+                    "const": np.log(np.diagonal(chol, axis1=1, axis2=2)).sum(axis=1) - M * np.log(2 * np.pi) / 2}
+        else:
+            raise ValueError(
+                "Error precision, dimension of precision must be 2 or 3!")
+
+    @staticmethod
+    def _calc_component_logpdf(test_X: np.ndarray, scoring_params: dict) -> np.ndarray:
+        """
+        n * K matrix of log N(x_i|m_k, S_k^{-1}) by GEMMs:
+            # diag: const_k - (x_i^2 cdot s_k) / 2 + x_i cdot (s_k m_k)
+            # full: const_k - |L_k^T x_i - L_k^T m_k|^2 / 2
+        """
+        if "precision" in scoring_params:
+            return scoring_params["const"] - (test_X**2) @ scoring_params["precision"].T / 2 + test_X @ scoring_params["precision_mean"].T
+        else:
+            n = test_X.shape[0]
+            K = len(scoring_params["const"])
+            y = test_X @ scoring_params["chol"] - scoring_params["chol_mean"]
+            return scoring_params["const"] - (y**2).reshape(n, K, -1).sum(axis=2) / 2
+
     def _calc_obj_func(self, **kwargs) -> float:
         """
         -ELBO is calculated.
@@ -393,33 +1231,51 @@ class GaussianMixtureModelVB(AbstractMixtureModel, DensityMixin, BaseEstimator):
             5. est_gamma
             6. est_delta
         """
+        est_h_xi = kwargs["est_h_xi"]
+        n = est_h_xi.shape[0]
+        M = kwargs["est_delta"].shape[1]
+
+        energy = self._calc_local_obj_func(**kwargs)
+        energy += self._calc_global_obj_func(**kwargs)
+        energy += n * M * np.log(2 * np.pi) / 2
+
+        return energy
+
+    def _calc_local_obj_func(self, **kwargs) -> float:
+        """
+        Terms of -ELBO summed over the data, except for the constant n * M * log(2 pi) / 2.
+        + Necessary arguments are est_u_xi and est_h_xi.
+        + est_log_norm given by _calc_diag_latent_variables is optional, the logsumexp of est_h_xi is not calculated again if it is given.
+        """
         est_u_xi = kwargs["est_u_xi"]
         est_h_xi = kwargs["est_h_xi"]
+
+        if "est_log_norm" in kwargs:
+            return -kwargs["est_log_norm"].sum(dtype=np.float64) + np.einsum("ik,ik->", est_u_xi, est_h_xi, dtype=np.float64)
+        max_h_xi = est_h_xi.max(axis=1)
+        norm_h_xi = est_h_xi - max_h_xi[:, np.newaxis]
+        return -(np.log(np.exp(norm_h_xi).sum(axis=1)) + max_h_xi).sum(dtype=np.float64) + np.einsum("ik,ik->", est_u_xi, est_h_xi, dtype=np.float64)
+
+    def _calc_global_obj_func(self, **kwargs) -> float:
+        """
+        Terms of -ELBO depending only on the posterior distribution of the parameter.
+        + Necessary arguments are est_alpha, est_beta, est_gamma and est_delta.
+        """
         est_alpha = kwargs["est_alpha"]
         est_beta = kwargs["est_beta"]
         est_gamma = kwargs["est_gamma"]
         est_delta = kwargs["est_delta"]
-
-        n = est_h_xi.shape[0]
         M = est_delta.shape[1]
 
-        max_h_xi = est_h_xi.max(axis=1)
-        norm_h_xi = est_h_xi - np.repeat(max_h_xi, self.K).reshape(n, self.K)
-        energy = -(np.log(np.exp(norm_h_xi).sum(axis=1)) +
-                   max_h_xi).sum() + (est_u_xi * est_h_xi).sum()
-        energy += gammaln(est_alpha.sum()) - gammaln(self.K * self.pri_alpha) + \
+        energy = gammaln(est_alpha.sum()) - gammaln(len(est_alpha) * self.pri_alpha) + \
             (-gammaln(est_alpha) + gammaln(self.pri_alpha)).sum()
         if self.method == "diag":
-            # energy =  -(np.log(np.exp(norm_h_xi).sum(axis = 1)) + max_h_xi).sum() + (est_u_xi * est_h_xi).sum()
-            # energy += gammaln(est_alpha.sum()) - gammaln(self.K*self.pri_alpha) + (-gammaln(est_alpha) + gammaln(self.pri_alpha)).sum()
             energy += (np.log(est_beta / self.pri_beta) / 2 + est_gamma * np.log(est_delta) -
                        self.pri_gamma * np.log(self.pri_delta) - gammaln(est_gamma) + gammaln(self.pri_gamma)).sum()
         elif self.method == "full":
             energy += (np.log(M * est_beta / self.pri_beta) / 2).sum()
             energy += (M * (self.pri_gamma - est_gamma) / 2 * np.log(2) + self.pri_gamma / 2 * np.log(M * self.pri_delta) + est_gamma / 2 *
-                       np.array([np.linalg(est_delta[:, :, k])[1] for k in self.K]) + multigammaln(self.pri_gamma / 2) - multigammaln(est_gamma / 2)).sum()
-        energy += n * M * np.log(2 * np.pi) / 2
-
+                       np.linalg.slogdet(est_delta.transpose((2, 0, 1)))[1] + multigammaln(self.pri_gamma / 2, M) - multigammaln(est_gamma / 2, M)).sum()
         return energy
 
     def get_params(self, deep=True):
@@ -433,7 +1289,12 @@ class GaussianMixtureModelVB(AbstractMixtureModel, DensityMixin, BaseEstimator):
             "restart_num": self.restart_num,
             "learning_seed": self.learning_seed,
             "tol": self.tol,
-            "step": self.step
+            "step": self.step,
+            "n_jobs": self.n_jobs,
+            "batch_restarts": self.batch_restarts,
+            "acceleration": self.acceleration,
+            "prune_threshold": self.prune_threshold,
+            "dtype": self.dtype
         }
 
     def set_params(self, **params):
@@ -32,10 +32,350 @@ Component of this module:
 2. class VBNormal uses a normal distribution for p(w)
 3. class VBApproxLaplace uses an approximated Laplace distribution for p(w)
 by the normal distribution.
+4. class LinearRegressionStats keeps the sufficient statistics
+X^T X, X^T y, y^T y and n, which are all the above classes need.
+They can be accumulated from chunks or a memory map,
+and each class is also fitted by fit_stats from the statistics alone.
+
+When M is much larger than n, the M times M matrices can not be formed.
+Then VBNormal and VBApproxLaplace work with n times n systems by the Woodbury identity
+(solver="dual"), and keep only the diagonal of sigma.
+Moreover, VBLaplace and VBApproxLaplace with covariance="diag" restrict q(w)
+to a diagonal (mean-field) normal distribution, which is updated coordinate by coordinate.
+Each sweep costs O(nM) and never forms X^T X.
+
+fit_path of VBLaplace and VBApproxLaplace fits a sequence of pri_beta,
+where X^T X is computed once and each fit is warm-started from the previous one.
 
 """
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from sklearn.base import BaseEstimator, RegressorMixin
+from scipy.linalg import lapack, cho_solve, solve_triangular
+from scipy.stats import invwishart, norm
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+
+from util.parallel import map_shared
+
+
+def _inv_by_cholesky(precision: np.ndarray):
+    """
+    Invert a positive definite matrix by one Cholesky factorization precision = L L^T.
+
+    + Input:
+        1. precision: (M, M) positive definite matrix
+
+    + Output:
+        1. sigma: inverse of precision, L^{-T} L^{-1}
+        2. log_det_sigma: log|sigma| = -2 sum_j log L_jj
+    """
+    chol, info = lapack.dpotrf(precision, lower=1)
+    if info != 0:
+        raise np.linalg.LinAlgError(
+            "precision matrix is not positive definite.")
+    sigma, info = lapack.dpotri(chol, lower=1)
+    # dpotri fills the lower triangle only.
+    sigma = np.tril(sigma) + np.tril(sigma, -1).T
+    return sigma, -2 * np.log(np.diag(chol)).sum()
+
+
+def _residual_sq(stats: "LinearRegressionStats", mean: np.ndarray) -> float:
+    """
+    |y - X mean|^2 = y^T y - 2 mean^T X^T y + mean^T X^T X mean by the sufficient statistics.
+    """
+    return stats.Y_sq - 2 * mean @ stats.XY_cov + mean @ stats.X_cov @ mean
+
+
+def _use_dual(solver: str, shape: tuple) -> bool:
+    """
+    Whether the dual form is used for the data of shape (n, M), solver="auto" uses it when M > n.
+    """
+    if solver not in ("auto", "primal", "dual"):
+        raise ValueError(
+            "solver must be \"auto\", \"primal\" or \"dual\".")
+    return solver == "dual" or (solver == "auto" and shape[1] > shape[0])
+
+
+def _primal_moments(stats: "LinearRegressionStats", prior_precision: np.ndarray) -> dict:
+    """
+    Posterior of the linear regression with the prior precision diag(d) by the M times M system
+    sigma^{-1} = X^T X + diag(d), which is factorized once.
+
+    + Output:
+        dict of mean, sigma, sigma_diag, log_det_sigma = log|sigma|,
+        residual_sq = |y - X mean|^2 and trace_X_cov_sigma = tr(X^T X sigma).
+    """
+    inv_sigma = stats.X_cov.copy()
+    inv_sigma[np.diag_indices_from(inv_sigma)] += prior_precision
+    sigma, log_det_sigma = _inv_by_cholesky(inv_sigma)
+    mean = sigma @ stats.XY_cov
+    return {"mean": mean, "sigma": sigma, "sigma_diag": np.diag(sigma).copy(), "log_det_sigma": log_det_sigma,
+            "residual_sq": _residual_sq(stats, mean), "trace_X_cov_sigma": (stats.X_cov * sigma).sum()}
+
+
+def _dual_moments(X: np.ndarray, y: np.ndarray, prior_precision: np.ndarray) -> dict:
+    """
+    The same values as _primal_moments by the n times n system C = I + X D^{-1} X^T = L L^T, where D = diag(d).
+    By the Woodbury identity sigma = D^{-1} - D^{-1} X^T C^{-1} X D^{-1}, and
+        # mean = D^{-1} X^T C^{-1} y, y - X mean = C^{-1} y
+        # diag(sigma) = 1/d - column sums of (L^{-1} X D^{-1})^2
+        # log|sigma| = -sum_j log d_j - log|C|
+        # tr(X^T X sigma) = n - tr(C^{-1})
+    The cost is O(n^2 M) and only n times M and n times n matrices are formed, so sigma is None.
+    """
+    n = X.shape[0]
+    XD = X / prior_precision
+    C = XD @ X.T
+    C[np.diag_indices(n)] += 1
+    chol = np.linalg.cholesky(C)
+    C_inv_y = cho_solve((chol, True), y)
+    mean = XD.T @ C_inv_y
+    inv_chol = solve_triangular(chol, np.eye(n), lower=True)
+    # XD is overwritten by L^{-1} X D^{-1}.
+    whitened_XD = solve_triangular(chol, XD, lower=True, overwrite_b=True)
+    sigma_diag = 1 / prior_precision - np.einsum("ij,ij->j", whitened_XD, whitened_XD)
+    return {"mean": mean, "sigma": None, "sigma_diag": sigma_diag,
+            "log_det_sigma": -np.log(prior_precision).sum() - 2 * np.log(np.diag(chol)).sum(),
+            "residual_sq": C_inv_y @ C_inv_y, "trace_X_cov_sigma": n - (inv_chol**2).sum()}
+
+
+def _check_covariance(covariance: str) -> bool:
+    """
+    Whether covariance is "diag", i.e. q(w) is restricted to a diagonal normal distribution.
+    """
+    if covariance not in ("full", "diag"):
+        raise ValueError("covariance must be \"full\" or \"diag\".")
+    return covariance == "diag"
+
+
+def _diag_design_from_data(X: np.ndarray, y: np.ndarray) -> dict:
+    """
+    Terms of the data used by covariance="diag", where X^T X is never formed.
+
+    + Output:
+        dict of n, XY_cov = X^T y, X_cov_diag = diag(X^T X) and coordinate_sweep, see below.
+    """
+    # Row j of X_T is the j-th column of X, it is a view when X is in Fortran order.
+    X_T = np.ascontiguousarray(X.T)
+    XY_cov = y @ X
+    X_cov_diag = np.einsum("ij,ij->j", X, X)
+
+    def coordinate_sweep(mean: np.ndarray, update) -> float:
+        """
+        For j = 1, ..., M, mean_j is replaced by update(j, c_j) in place, where
+        c_j = (X^T y)_j - sum_{k != j} (X^T X)_{jk} mean_k is given by the residual y - X mean,
+        which is kept up to date in O(n) per coordinate.
+        The output is |y - X mean|^2 of the updated mean.
+        """
+        residual = y - X @ mean
+        for j in range(len(mean)):
+            X_j = X_T[j]
+            new_mean_j = update(j, X_j @ residual + X_cov_diag[j] * mean[j])
+            residual -= (new_mean_j - mean[j]) * X_j
+            mean[j] = new_mean_j
+        return residual @ residual
+    return {"n": X.shape[0], "XY_cov": XY_cov, "X_cov_diag": X_cov_diag, "coordinate_sweep": coordinate_sweep}
+
+
+def _diag_design_from_stats(stats: "LinearRegressionStats") -> dict:
+    """
+    The same terms as _diag_design_from_data by the sufficient statistics,
+    where X^T X mean is kept up to date in O(M) per coordinate instead of the residual.
+    """
+    X_cov = stats.X_cov
+    XY_cov = stats.XY_cov
+    X_cov_diag = np.diag(X_cov).copy()
+
+    def coordinate_sweep(mean: np.ndarray, update) -> float:
+        X_cov_mean = X_cov @ mean
+        for j in range(len(mean)):
+            new_mean_j = update(j, XY_cov[j] - X_cov_mean[j] + X_cov_diag[j] * mean[j])
+            X_cov_mean += (new_mean_j - mean[j]) * X_cov[j]
+            mean[j] = new_mean_j
+        return _residual_sq(stats, mean)
+    return {"n": stats.n, "XY_cov": XY_cov, "X_cov_diag": X_cov_diag, "coordinate_sweep": coordinate_sweep}
+
+
+def _diag_moments(mean: np.ndarray, sigma_diag: np.ndarray, design: dict, residual_sq: float) -> dict:
+    """
+    Posterior moments of the diagonal q(w) in the form of _primal_moments.
+    """
+    return {"mean": mean, "sigma": None, "sigma_diag": sigma_diag,
+            "log_det_sigma": np.log(sigma_diag).sum(), "residual_sq": residual_sq,
+            "trace_X_cov_sigma": design["X_cov_diag"] @ sigma_diag}
+
+
+def _fit_path(estimator, train_X: np.ndarray, train_Y: np.ndarray, pri_beta_list: list,
+              use_gram: bool, full: bool, chunk_size: int, n_jobs: int):
+    """
+    Common part of fit_path, see VBLaplace.fit_path.
+
+    + Input:
+        4. use_gram: whether each fit is done by fit_stats with the shared X^T X,
+        otherwise by _prepare_fit with the data, whose terms are computed once a target and reused along the path.
+        5. full: whether the initial value has the full covariance, see _initialization.
+    """
+    (n, M) = train_X.shape
+    Y = np.asarray(train_Y, dtype=np.float64)
+    n_targets = 1 if Y.ndim == 1 else Y.shape[1]
+    Y = Y.reshape(n, n_targets)
+
+    if use_gram:
+        X_cov = np.zeros((M, M))
+        XY_cov = np.zeros((M, n_targets))
+        for start in range(0, n, chunk_size):
+            X = np.asarray(train_X[start:start + chunk_size], dtype=np.float64)
+            X_cov += X.T @ X
+            XY_cov += X.T @ Y[start:start + chunk_size]
+        target_stats = [LinearRegressionStats.from_gram(X_cov, XY_cov[:, t].copy(), Y[:, t] @ Y[:, t], n)
+                        for t in range(n_targets)]
+
+        def prepare_fit(target_estimator, t):
+            return lambda: target_estimator.fit_stats(target_stats[t])
+    else:
+        X = np.asarray(train_X, dtype=np.float64)
+
+        def prepare_fit(target_estimator, t):
+            return target_estimator._prepare_fit(X, Y[:, t])
+
+    # The initial values are drawn here, since np.random.seed of _initialization is not thread safe.
+    target_estimators = []
+    for t in range(n_targets):
+        target_estimator = clone(estimator).set_params(pri_opt_flag=False)
+        target_estimator._initialization(M, full)
+        target_estimators.append(target_estimator)
+
+    def fit_target(t: int):
+        target_estimator = target_estimators[t]
+        fit = prepare_fit(target_estimator, t)
+        mean = np.empty((len(pri_beta_list), M))
+        sigma_diag = np.empty((len(pri_beta_list), M))
+        for (i, pri_beta) in enumerate(pri_beta_list):
+            # mean_ and sigma_ of the previous fit are kept as the initial value.
+            target_estimator.set_params(pri_beta=pri_beta)
+            target_estimator.pri_beta_ = pri_beta
+            fit()
+            mean[i] = target_estimator.mean_
+            sigma_diag[i] = target_estimator.sigma_diag_
+        return (mean, sigma_diag)
+
+    n_jobs = os.cpu_count() if n_jobs < 0 else n_jobs
+    if n_jobs == 1 or n_targets == 1:
+        results = [fit_target(t) for t in range(n_targets)]
+    else:
+        # BLAS releases the GIL, so threads share X^T X without copying it.
+        with ThreadPoolExecutor(max_workers=min(n_jobs, n_targets)) as executor:
+            results = list(executor.map(fit_target, range(n_targets)))
+
+    mean = np.stack([result[0] for result in results])
+    sigma_diag = np.stack([result[1] for result in results])
+    if np.ndim(train_Y) == 1:
+        return (mean[0], sigma_diag[0])
+    return (mean, sigma_diag)
+
+
+class LinearRegressionStats:
+    """
+    Sufficient statistics of the VB linear regressors:
+    X_cov = X^T X, XY_cov = X^T y, Y_sq = y^T y and n.
+
+    The statistics are accumulated chunk by chunk by update,
+    and the ones of several shards are merged by merge (or +),
+    so that the data is never kept in memory as a whole.
+    """
+
+    def __init__(self, M: int):
+        self.X_cov = np.zeros((M, M))
+        self.XY_cov = np.zeros(M)
+        self.Y_sq = 0.
+        self.n = 0
+        pass
+
+    def update(self, X: np.ndarray, y: np.ndarray):
+        """
+        Add the statistics of a chunk X (n_c, M) and y (n_c, ).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.X_cov += X.T @ X
+        self.XY_cov += y @ X
+        self.Y_sq += y @ y
+        self.n += X.shape[0]
+        return self
+
+    def merge(self, other: "LinearRegressionStats"):
+        """
+        Add the statistics of another shard.
+        """
+        self.X_cov += other.X_cov
+        self.XY_cov += other.XY_cov
+        self.Y_sq += other.Y_sq
+        self.n += other.n
+        return self
+
+    def __add__(self, other: "LinearRegressionStats"):
+        return LinearRegressionStats(len(self.XY_cov)).merge(self).merge(other)
+
+    @classmethod
+    def from_gram(cls, X_cov: np.ndarray, XY_cov: np.ndarray, Y_sq: float, n: int):
+        """
+        Statistics of the given values, X_cov is not copied so that it is shared, e.g. among the targets of fit_path.
+        """
+        stats = cls.__new__(cls)
+        stats.X_cov = X_cov
+        stats.XY_cov = XY_cov
+        stats.Y_sq = Y_sq
+        stats.n = n
+        return stats
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Statistics of an iterable of (X_c, y_c) chunks.
+        """
+        stats = None
+        for (X, y) in chunks:
+            if stats is None:
+                stats = cls(X.shape[1])
+            stats.update(X, y)
+        if stats is None:
+            raise ValueError("chunks must contain at least one chunk.")
+        return stats
+
+    @classmethod
+    def from_data(cls, train_X: np.ndarray, train_Y: np.ndarray,
+                  chunk_size: int = 100000, n_jobs: int = 1):
+        """
+        Statistics of train_X and train_Y accumulated by chunk_size rows.
+
+        + Input:
+            1. train_X: (n, M) array or np.memmap, only chunk_size rows are loaded at once.
+            2. train_Y: (n, ) array or np.memmap.
+            3. chunk_size: number of rows of a chunk.
+            4. n_jobs: number of processes accumulating the chunks, -1 means the number of cpus.
+                The statistics of each chunk are merged in this process.
+                train_X is shared by a memory map, see util.parallel.map_shared.
+        """
+        n = train_X.shape[0]
+        args = [(start, np.asarray(train_Y[start:start + chunk_size]))
+                for start in range(0, n, chunk_size)]
+        stats = cls(train_X.shape[1])
+        for chunk_stats in map_shared(_chunk_stats, train_X, args, n_jobs=n_jobs):
+            stats.merge(chunk_stats)
+        return stats
+
+    pass
+
+
+def _chunk_stats(X: np.ndarray, arg: tuple) -> LinearRegressionStats:
+    """
+    Statistics of the chunk X[start:start + len(y)], used by LinearRegressionStats.from_data.
+    """
+    (start, y) = arg
+    return LinearRegressionStats(X.shape[1]).update(X[start:start + len(y)], y)
+
 
 
 class VBLaplace(BaseEstimator, RegressorMixin):
@@ -43,7 +383,8 @@ class VBLaplace(BaseEstimator, RegressorMixin):
         self, pri_beta: float = 20, pri_opt_flag: bool = True,
         seed: int = -1, iteration: int = 1000,
         tol: float = 1e-8, step: float = 0.1,
-        is_trace: bool = False, trace_step: int = 20
+        is_trace: bool = False, trace_step: int = 20,
+        covariance: str = "full"
     ):
         """
         VB algorithm with the Laplace distribution as the prior distribution.
@@ -67,6 +408,11 @@ class VBLaplace(BaseEstimator, RegressorMixin):
 
             7. is_trace: whether the result is printed or not.
                 -> square of derivative for F and F itself is printed out.
+
+            8. covariance: "full" or "diag", form of the covariance of q(w).
+                -> "diag" is the mean-field approximation q(w) = prod_j N(w_j|mean_j, sigma_jj),
+                and each iteration costs O(nM) without X^T X.
+                sigma_ is None, and the posterior variances are given by sigma_diag_.
         """
         self.pri_beta = pri_beta
         self.pri_opt_flag = pri_opt_flag
@@ -76,43 +422,52 @@ class VBLaplace(BaseEstimator, RegressorMixin):
         self.step = step
         self.is_trace = is_trace
         self.trace_step = trace_step
+        self.covariance = covariance
         pass
 
-    def _initialization(self, M: int):
+    def _initialization(self, M: int, full: bool = True):
         seed = self.seed
 
         if seed > 0:
             np.random.seed(seed)
 
         mean = np.random.normal(size=M)
-        sigma = invwishart.rvs(df=M + 2, scale=np.eye(M), size=1)
+        if full:
+            sigma = invwishart.rvs(df=M + 2, scale=np.eye(M), size=1)
+            sigma_diag = np.diag(sigma).copy()
+        else:
+            # Each diagonal element of the above inverse Wishart follows 1 / chi^2(3).
+            sigma = None
+            sigma_diag = 1 / np.random.chisquare(3, size=M)
         pri_beta = np.random.gamma(
             shape=3, size=1) if self.pri_opt_flag else self.pri_beta
 
         self.mean_ = mean
         self.sigma_ = sigma
+        self.sigma_diag_ = sigma_diag
         self.pri_beta_ = pri_beta
         pass
 
-    def _obj_func(self, X: np.ndarray, y: np.ndarray, pri_beta: float,
-                  mean: np.ndarray, sigma: np.ndarray) -> float:
+    def _obj_func(self, n: int, pri_beta: float, moments: dict) -> float:
         """
         Calculate objective function.
+        X is used through the terms in moments only, so the cost does not depend on n.
 
         + Input:
-            1. X: input matrix (n, M) matrix
-            2. y: output vector (n, ) matrix
-            3. mean: mean parameter of vb posterior
-            4. sigma: covariance matrix of vb posterior
+            1. n: # of samples
+            2. pri_beta: hyperparameter of laplace prior distribution
+            3. moments: mean, sigma_diag, log_det_sigma, residual_sq and trace_X_cov_sigma of vb posterior,
+            see _primal_moments.
 
         + Output:
             value of the objective function.
 
         """
 
-        n, M = X.shape
+        mean = moments["mean"]
+        M = len(mean)
 
-        sq_sigma_diag = np.sqrt(np.diag(sigma))
+        sq_sigma_diag = np.sqrt(moments["sigma_diag"])
         log_2pi = np.log(2 * np.pi)
 
         F = 0
@@ -120,8 +475,8 @@ class VBLaplace(BaseEstimator, RegressorMixin):
         F += -M / 2 * log_2pi - M / 2 + M * log_2pi + \
             n * M / 2 * log_2pi + M * np.log(2 * pri_beta)
 
-        F += ((y - X @ mean)**2).sum() / 2 - \
-            np.linalg.slogdet(sigma)[1] / 2 + np.trace(X.T @ X @ sigma) / 2
+        F += moments["residual_sq"] / 2 - \
+            moments["log_det_sigma"] / 2 + moments["trace_X_cov_sigma"] / 2
 
         # term obtained from laplace prior
         F += ((mean + 2 * sq_sigma_diag * norm.pdf(-mean / sq_sigma_diag) -
@@ -130,6 +485,27 @@ class VBLaplace(BaseEstimator, RegressorMixin):
         return F
 
     def fit(self, train_X: np.ndarray, train_Y: np.ndarray):
+        return self._prepare_fit(train_X, train_Y)()
+
+    def _prepare_fit(self, train_X: np.ndarray, train_Y: np.ndarray):
+        """
+        The terms of the data (the design of covariance="diag" or the sufficient statistics) are computed once,
+        and the output is a function fitting this estimator by them from the current mean_, used by fit and fit_path.
+        """
+        if _check_covariance(self.covariance):
+            design = _diag_design_from_data(
+                np.asarray(train_X, dtype=np.float64), np.asarray(train_Y, dtype=np.float64))
+            return lambda: self._fit_diag(design)
+        stats = LinearRegressionStats.from_data(train_X, train_Y)
+        return lambda: self.fit_stats(stats)
+
+    def fit_stats(self, stats: LinearRegressionStats):
+        """
+        Fit by the sufficient statistics alone, e.g. made by LinearRegressionStats.from_data.
+        """
+        if _check_covariance(self.covariance):
+            return self._fit_diag(_diag_design_from_stats(stats))
+
         pri_beta = self.pri_beta
         iteration = self.iteration
         step = self.step
@@ -138,13 +514,14 @@ class VBLaplace(BaseEstimator, RegressorMixin):
         is_trace = self.is_trace
         trace_step = self.trace_step
 
-        M = train_X.shape[1]
+        M = len(stats.XY_cov)
 
         if not hasattr(self, "mean_"):
             self._initialization(M)
 
         est_mean = self.mean_
-        est_sigma = self.sigma_
+        # After a fit with covariance="diag", sigma_ is None and the diagonal posterior is used as the initial value.
+        est_sigma = np.diag(self.sigma_diag_) if self.sigma_ is None else self.sigma_
         est_pri_beta = self.pri_beta_
 
         # transformation to natural parameter
@@ -153,8 +530,9 @@ class VBLaplace(BaseEstimator, RegressorMixin):
 
         F = []
 
-        cov_X = train_X.T @ train_X
-        cov_YX = train_Y @ train_X
+        # Gram matrix is given by stats, then each iteration costs O(M^3) independent of n.
+        cov_X = stats.X_cov
+        cov_YX = stats.XY_cov
         for ite in range(iteration):
             sq_sigma_diag = np.sqrt(np.diag(est_sigma))
 
@@ -169,7 +547,8 @@ class VBLaplace(BaseEstimator, RegressorMixin):
 
             theta1 += -step * dFdnu1
             theta2 += -step * dFdnu2
-            est_sigma = -np.linalg.inv(theta2) / 2
+            # One Cholesky factorization of the precision -2 theta2 gives sigma, mean and log|sigma|.
+            est_sigma, log_det_sigma = _inv_by_cholesky(-2 * theta2)
             est_mean = est_sigma @ theta1
 
             # update pri_beta by extreme value
@@ -178,8 +557,10 @@ class VBLaplace(BaseEstimator, RegressorMixin):
             est_pri_beta = ((est_mean +
                              2 * sq_sigma_diag * norm.pdf(-mean_sigma_ratio)
                              - 2 * est_mean * norm.cdf(-mean_sigma_ratio))).mean() if self.pri_opt_flag else pri_beta
-            current_F = self._obj_func(
-                train_X, train_Y, est_pri_beta, est_mean, est_sigma)
+            # tr(X^T X sigma) is an elementwise sum for symmetric sigma.
+            moments = {"mean": est_mean, "sigma_diag": np.diag(est_sigma).copy(), "log_det_sigma": log_det_sigma,
+                       "residual_sq": _residual_sq(stats, est_mean), "trace_X_cov_sigma": (cov_X * est_sigma).sum()}
+            current_F = self._obj_func(stats.n, est_pri_beta, moments)
             if is_trace and ite % trace_step == 0:
                 print(current_F, (dFdnu1**2).sum(), (dFdnu2**2).sum())
 
@@ -194,11 +575,113 @@ class VBLaplace(BaseEstimator, RegressorMixin):
         self.F_ = F
         self.mean_ = est_mean
         self.sigma_ = est_sigma
+        self.sigma_diag_ = moments["sigma_diag"]
+        self.pri_beta_ = est_pri_beta
+
+        return self
+        pass
+
+    def _fit_diag(self, design: dict):
+        """
+        Natural gradient method for covariance="diag" with natural parameters
+        theta1_j = mean_j / sigma_jj and theta2_j = -1 / (2 sigma_jj), which is applied coordinate by coordinate.
+        Since E_q[w_j w_k] = mean_j mean_k for j != k, the gradient of the likelihood term is
+        -c_j for theta1_j and (X^T X)_jj / 2 for theta2_j, where c_j is given by design["coordinate_sweep"].
+        """
+        pri_beta = self.pri_beta
+        iteration = self.iteration
+        step = self.step
+        tol = self.tol
+
+        is_trace = self.is_trace
+        trace_step = self.trace_step
+
+        M = len(design["XY_cov"])
+        X_cov_diag = design["X_cov_diag"]
+
+        if not hasattr(self, "mean_"):
+            self._initialization(M, full=False)
+
+        est_mean = np.array(self.mean_, dtype=np.float64)
+        est_pri_beta = self.pri_beta_
+
+        # transformation to natural parameter
+        theta1 = est_mean / self.sigma_diag_
+        theta2 = -1 / (2 * self.sigma_diag_)
+
+        def update(j: int, c_j: float) -> float:
+            # 1-dimensional natural gradient step, math is used since it is called M times a sweep.
+            sigma_jj = -1 / (2 * theta2[j])
+            sq_sigma_jj = math.sqrt(sigma_jj)
+            ratio = theta1[j] * sigma_jj / sq_sigma_jj
+            pdf = math.exp(-ratio**2 / 2) / math.sqrt(2 * math.pi)
+            cdf = math.erfc(ratio / math.sqrt(2)) / 2
+            dFdnu1 = theta1[j] - c_j + (1 - 2 * ratio * pdf - 2 * cdf) * inv_pri_beta
+            dFdnu2 = theta2[j] + X_cov_diag[j] / 2 + pdf / sq_sigma_jj * inv_pri_beta
+            theta1[j] += -step * dFdnu1
+            theta2[j] += -step * dFdnu2
+            return -theta1[j] / (2 * theta2[j])
+
+        F = []
+
+        for ite in range(iteration):
+            # float of est_pri_beta, which is read by update.
+            inv_pri_beta = 1 / float(np.squeeze(est_pri_beta))
+            residual_sq = design["coordinate_sweep"](est_mean, update)
+            est_sigma_diag = -1 / (2 * theta2)
+
+            # update pri_beta by extreme value
+            sq_sigma_diag = np.sqrt(est_sigma_diag)
+            mean_sigma_ratio = est_mean / sq_sigma_diag
+            est_pri_beta = ((est_mean +
+                             2 * sq_sigma_diag * norm.pdf(-mean_sigma_ratio)
+                             - 2 * est_mean * norm.cdf(-mean_sigma_ratio))).mean() if self.pri_opt_flag else pri_beta
+
+            moments = _diag_moments(est_mean, est_sigma_diag, design, residual_sq)
+            current_F = self._obj_func(design["n"], est_pri_beta, moments)
+            if is_trace and ite % trace_step == 0:
+                print(current_F)
+
+            if ite > 0 and np.abs(current_F - F[ite - 1]) < tol:
+                if is_trace:
+                    print(current_F)
+                break
+            else:
+                F.append(current_F)
+            pass
+
+        self.F_ = F
+        self.mean_ = est_mean
+        self.sigma_ = None
+        self.sigma_diag_ = est_sigma_diag
         self.pri_beta_ = est_pri_beta
 
         return self
         pass
 
+    def fit_path(self, train_X: np.ndarray, train_Y: np.ndarray, pri_beta_list: list,
+                 chunk_size: int = 100000, n_jobs: int = 1):
+        """
+        Regularization path, i.e. fits with pri_beta = pri_beta_list[0], pri_beta_list[1], ... in this order.
+        pri_beta is fixed in each fit (pri_opt_flag is not used), X^T X is computed once and shared,
+        and each fit is warm-started from the previous one.
+        This estimator itself is not changed.
+
+        + Input:
+            1. train_X: (n, M) array or np.memmap, X^T X is accumulated by chunk_size rows.
+            2. train_Y: (n, ) vector or (n, T) matrix of T independent targets.
+            3. pri_beta_list: sequence of pri_beta.
+            4. n_jobs: number of threads fitting the targets, -1 means the number of cpus.
+
+        + Output:
+            1. mean: (P, M) means for P = len(pri_beta_list), or (T, P, M) for the T targets.
+            2. sigma_diag: posterior variances of the same shape as mean.
+        """
+        diag = _check_covariance(self.covariance)
+        # The diagonal mode works with the data itself when X^T X is larger than X.
+        use_gram = not (diag and train_X.shape[1] > train_X.shape[0])
+        return _fit_path(self, train_X, train_Y, pri_beta_list, use_gram, not diag, chunk_size, n_jobs)
+
     def predict(self, test_X: np.ndarray):
         if not hasattr(self, "mean_"):
             raise ValueError(
@@ -214,7 +697,8 @@ class VBNormal(BaseEstimator, RegressorMixin):
         self, pri_beta: float = 20, pri_opt_flag: bool = True,
         seed: int = -1, iteration: int = 1000,
         tol: float = 1e-8, step: float = 0.1,
-        is_trace: bool = False, trace_step: int = 20
+        is_trace: bool = False, trace_step: int = 20,
+        solver: str = "auto"
     ):
         """
         VB algorithm with the normal distribution as the prior distribution.
@@ -239,6 +723,12 @@ class VBNormal(BaseEstimator, RegressorMixin):
 
             7. is_trace: whether the result is printed or not.
                 -> square of derivative for F and F itself is printed out.
+
+            8. solver: "primal" solves M times M systems of X^T X,
+            "dual" solves n times n systems of X X^T by the Woodbury identity,
+            and "auto" uses "dual" when M > n.
+                -> "dual" keeps only the diagonal of sigma, i.e. sigma_ is None,
+                and the posterior variances are given by sigma_diag_.
         """
         self.pri_beta = pri_beta
         self.pri_opt_flag = pri_opt_flag
@@ -248,41 +738,48 @@ class VBNormal(BaseEstimator, RegressorMixin):
         self.step = step
         self.is_trace = is_trace
         self.trace_step = trace_step
+        self.solver = solver
         pass
 
-    def _initialization(self, M: int):
+    def _initialization(self, M: int, full: bool = True):
         seed = self.seed
 
         if seed > 0:
             np.random.seed(seed)
 
         mean = np.random.normal(size=M)
-        sigma = invwishart.rvs(df=M + 2, scale=np.eye(M), size=1)
+        if full:
+            sigma = invwishart.rvs(df=M + 2, scale=np.eye(M), size=1)
+            sigma_diag = np.diag(sigma).copy()
+        else:
+            # Each diagonal element of the above inverse Wishart follows 1 / chi^2(3).
+            sigma = None
+            sigma_diag = 1 / np.random.chisquare(3, size=M)
         pri_beta = np.random.gamma(
             shape=3, size=1) if self.pri_opt_flag else self.pri_beta
 
         self.mean_ = mean
         self.sigma_ = sigma
+        self.sigma_diag_ = sigma_diag
         self.pri_beta_ = pri_beta
         pass
 
-    def _obj_func(self, X: np.ndarray, y: np.ndarray, pri_beta: float,
-                  mean: np.ndarray, sigma: np.ndarray) -> float:
+    def _obj_func(self, n: int, pri_beta: float, moments: dict) -> float:
         """
         Calculate objective function.
 
         + Input:
-            1. X: input matrix (n, M) matrix
-            2. y: output vector (n, ) matrix
-            3. mean: mean parameter of vb posterior
-            4. sigma: covariance matrix of vb posterior
+            1. n: # of samples
+            2. pri_beta: hyperparameter of normal prior distribution
+            3. moments: posterior given by _primal_moments or _dual_moments
 
         + Output:
             value of the objective function.
 
         """
 
-        n, M = X.shape
+        mean = moments["mean"]
+        M = len(mean)
 
         log_2pi = np.log(2 * np.pi)
 
@@ -291,54 +788,61 @@ class VBNormal(BaseEstimator, RegressorMixin):
         F += -M / 2 * log_2pi - M / 2 + M * log_2pi + \
             n * M / 2 * log_2pi + M * np.log(2 * pri_beta)
 
-        F += ((y - X @ mean)**2).sum() / 2 - \
-            np.linalg.slogdet(sigma)[1] / 2 + np.trace(X.T @ X @ sigma) / 2
+        F += moments["residual_sq"] / 2 - \
+            moments["log_det_sigma"] / 2 + moments["trace_X_cov_sigma"] / 2
 
         # term obtained from Normal prior
-        F += pri_beta / 2 * (mean @ mean + np.trace(sigma)) - \
+        F += pri_beta / 2 * (mean @ mean + moments["sigma_diag"].sum()) - \
             M / 2 * np.log(pri_beta) + M / 2 * log_2pi
 
         return F
 
     def fit(self, train_X: np.ndarray, train_Y: np.ndarray):
+        if _use_dual(self.solver, train_X.shape):
+            X = np.asarray(train_X, dtype=np.float64)
+            y = np.asarray(train_Y, dtype=np.float64)
+            return self._fit_moments(lambda d: _dual_moments(X, y, d), X.shape[0], X.shape[1], full=False)
+        return self.fit_stats(LinearRegressionStats.from_data(train_X, train_Y))
+
+    def fit_stats(self, stats: LinearRegressionStats):
+        """
+        Fit by the sufficient statistics alone, e.g. made by LinearRegressionStats.from_data.
+        """
+        return self._fit_moments(lambda d: _primal_moments(stats, d), stats.n, len(stats.XY_cov))
+
+    def _fit_moments(self, calc_moments, n: int, M: int, full: bool = True):
+        """
+        Iteration common to the primal and dual form, calc_moments(d) gives the posterior for the prior precision d.
+        """
         pri_beta = self.pri_beta
         iteration = self.iteration
-        step = self.step
         tol = self.tol
 
         is_trace = self.is_trace
         trace_step = self.trace_step
 
-        M = train_X.shape[1]
-
         if not hasattr(self, "mean_"):
-            self._initialization(M)
+            self._initialization(M, full)
 
-        est_mean = self.mean_
-        est_sigma = self.sigma_
         est_pri_beta = self.pri_beta_
 
         F = []
-        XY_cov = train_Y @ train_X
-        X_cov = train_X.T @ train_X
 
         for ite in range(iteration):
-            sigma_inv = X_cov + est_pri_beta * np.eye(M)
-            est_mean = np.linalg.solve(sigma_inv, XY_cov)
-            est_sigma = np.linalg.inv(sigma_inv)
+            moments = calc_moments(np.full(M, est_pri_beta, dtype=np.float64))
+            est_mean = moments["mean"]
 
             # update pri_beta by extreme value
             est_pri_beta = M / \
-                (est_mean @ est_mean + np.trace(est_sigma)
+                (est_mean @ est_mean + moments["sigma_diag"].sum()
                  ) if self.pri_opt_flag else pri_beta
-            current_F = self._obj_func(
-                train_X, train_Y, est_pri_beta, est_mean, est_sigma)
+            current_F = self._obj_func(n, est_pri_beta, moments)
             if is_trace and ite % trace_step == 0:
-                print(current_F, (dFdnu1**2).sum(), (dFdnu2**2).sum())
+                print(current_F)
 
             if ite > 0 and np.abs(current_F - F[ite - 1]) < tol:
                 if is_trace:
-                    print(current_F, (dFdnu1**2).sum(), (dFdnu2**2).sum())
+                    print(current_F)
                 break
             else:
                 F.append(current_F)
@@ -346,7 +850,8 @@ class VBNormal(BaseEstimator, RegressorMixin):
 
         self.F_ = F
         self.mean_ = est_mean
-        self.sigma_ = est_sigma
+        self.sigma_ = moments["sigma"]
+        self.sigma_diag_ = moments["sigma_diag"]
         self.pri_beta_ = est_pri_beta
 
         return self
@@ -367,7 +872,8 @@ class VBApproxLaplace(BaseEstimator, RegressorMixin):
         self, pri_beta: float = 20, pri_opt_flag: bool = True,
         seed: int = -1, iteration: int = 1000,
         tol: float = 1e-8, step: float = 0.1,
-        is_trace: bool = False, trace_step: int = 20
+        is_trace: bool = False, trace_step: int = 20,
+        solver: str = "auto", covariance: str = "full"
     ):
         """
         Laplace prior is approximated by normal distribution,
@@ -378,6 +884,10 @@ class VBApproxLaplace(BaseEstimator, RegressorMixin):
         "Bayesian Inference and Optimal Design in the Sparse Linear Model",
         2012.
 
+        The other arguments are the same as VBNormal,
+        solver="dual" (or "auto" with M > n) keeps only the diagonal of sigma.
+        covariance="diag" restricts q(w) to a diagonal normal distribution as VBLaplace,
+        which is updated by the exact coordinate ascent of each w_j, and solver is not used.
         """
         self.pri_beta = pri_beta
         self.pri_opt_flag = pri_opt_flag
@@ -387,94 +897,151 @@ class VBApproxLaplace(BaseEstimator, RegressorMixin):
         self.step = step
         self.is_trace = is_trace
         self.trace_step = trace_step
+        self.solver = solver
+        self.covariance = covariance
         pass
 
-    def _initialization(self, M: int):
+    def _initialization(self, M: int, full: bool = True):
         seed = self.seed
 
         if seed > 0:
             np.random.seed(seed)
 
         mean = np.random.normal(size=M)
-        sigma = invwishart.rvs(df=M + 2, scale=np.eye(M), size=1)
+        if full:
+            sigma = invwishart.rvs(df=M + 2, scale=np.eye(M), size=1)
+            sigma_diag = np.diag(sigma).copy()
+        else:
+            # Each diagonal element of the above inverse Wishart follows 1 / chi^2(3).
+            sigma = None
+            sigma_diag = 1 / np.random.chisquare(3, size=M)
         pri_beta = np.random.gamma(
             shape=3, size=1) if self.pri_opt_flag else self.pri_beta
 
         self.mean_ = mean
         self.sigma_ = sigma
+        self.sigma_diag_ = sigma_diag
         self.pri_beta_ = pri_beta
         pass
 
-    def _obj_func(self, y: np.ndarray, pri_beta: float,
-                  mean: np.ndarray, inv_sigma: np.ndarray,
+    def _obj_func(self, n: int, pri_beta: float, moments: dict,
                   h_xi: np.ndarray, v_xi: np.ndarray) -> float:
         """
         Calculate objective function.
+        The expectation is taken for any normal q(w), which coincides with the closed form
+        y^T y / 2 - mean^T sigma^{-1} mean / 2 + log|sigma^{-1}| / 2 at the optimal full covariance.
 
         + Input:
-            1. X: input matrix (n, M) matrix
-            2. y: output vector (n, ) matrix
-            3. pri_beta: hyperparameter of laplace prior distribution
-            4. mean: mean parameter of vb posterior
-            5. inv_sigma: covariance inverse matrix of vb posterior
-            6. h_xi: complementary elements to approximate the Laplace prior
-            7. v_xi: Complementary elements to approximate the Laplace prior
+            1. n: # of samples
+            2. pri_beta: hyperparameter of laplace prior distribution
+            3. moments: posterior given by _primal_moments, _dual_moments or _diag_moments
+            4. h_xi: complementary elements to approximate the Laplace prior
+            5. v_xi: Complementary elements to approximate the Laplace prior
 
         + Output:
             value of the objective function.
 
         """
 
+        mean = moments["mean"]
+        M = len(mean)
+
         F = 0
-        F += pri_beta / 2 * np.sqrt(h_xi).sum() + \
+        F += pri_beta * np.sqrt(h_xi).sum() + \
             v_xi @ h_xi - M * np.log(pri_beta / 2)
-        F += n / 2 * np.log(2 * np.pi) + train_Y @ train_Y / 2 - \
-            mean @ (inv_sigma @ mean) / 2 + np.linalg.slogdet(inv_sigma)[0] / 2
+        F += n / 2 * np.log(2 * np.pi) + moments["residual_sq"] / 2 + moments["trace_X_cov_sigma"] / 2 - \
+            v_xi @ (mean**2 + moments["sigma_diag"]) - moments["log_det_sigma"] / 2 - M / 2
         return F
 
     def fit(self, train_X: np.ndarray, train_Y: np.ndarray):
+        return self._prepare_fit(train_X, train_Y)()
+
+    def _prepare_fit(self, train_X: np.ndarray, train_Y: np.ndarray):
+        """
+        The terms of the data are computed once, see VBLaplace._prepare_fit.
+        The dual form keeps X and y in float64, since C = I + X D^{-1} X^T changes with the prior precision.
+        """
+        (n, M) = train_X.shape
+        if _check_covariance(self.covariance):
+            design = _diag_design_from_data(
+                np.asarray(train_X, dtype=np.float64), np.asarray(train_Y, dtype=np.float64))
+            return lambda: self._fit_moments(self._diag_step(design), n, M, full=False)
+        if _use_dual(self.solver, train_X.shape):
+            X = np.asarray(train_X, dtype=np.float64)
+            y = np.asarray(train_Y, dtype=np.float64)
+            return lambda: self._fit_moments(lambda d: _dual_moments(X, y, d), n, M, full=False)
+        stats = LinearRegressionStats.from_data(train_X, train_Y)
+        return lambda: self.fit_stats(stats)
+
+    def fit_stats(self, stats: LinearRegressionStats):
+        """
+        Fit by the sufficient statistics alone, e.g. made by LinearRegressionStats.from_data.
+        """
+        if _check_covariance(self.covariance):
+            design = _diag_design_from_stats(stats)
+            return self._fit_moments(self._diag_step(design), stats.n, len(stats.XY_cov), full=False)
+        return self._fit_moments(lambda d: _primal_moments(stats, d), stats.n, len(stats.XY_cov))
+
+    def _diag_step(self, design: dict):
+        """
+        calc_moments of _fit_moments for covariance="diag".
+        For the precision d = -2 v_xi, the optimal diagonal q(w) has sigma_jj = 1 / ((X^T X)_jj + d_j)
+        and mean_j = c_j sigma_jj with c_j of design["coordinate_sweep"], which is one sweep of coordinate ascent.
+        """
+        state = dict()
+
+        def calc_moments(prior_precision: np.ndarray) -> dict:
+            # The initial mean is given by _fit_moments before the first call.
+            if not state:
+                state["mean"] = np.array(self.mean_, dtype=np.float64)
+            sigma_diag = 1 / (design["X_cov_diag"] + prior_precision)
+            residual_sq = design["coordinate_sweep"](state["mean"], lambda j, c_j: c_j * sigma_diag[j])
+            return _diag_moments(state["mean"].copy(), sigma_diag, design, residual_sq)
+        return calc_moments
+
+    def _fit_moments(self, calc_moments, n: int, M: int, full: bool = True):
+        """
+        Iteration common to the primal and dual form, calc_moments(d) gives the posterior for the prior precision d.
+        """
+        pri_beta = self.pri_beta
         iteration = self.iteration
-        step = self.step
         tol = self.tol
 
         is_trace = self.is_trace
         trace_step = self.trace_step
 
-        M = train_X.shape[1]
-
         if not hasattr(self, "mean_"):
-            self._initialization(M)
+            self._initialization(M, full)
 
         est_mean = self.mean_
-        est_sigma = self.sigma_
+        est_sigma_diag = self.sigma_diag_
         est_pri_beta = self.pri_beta_
 
         F = []
-        X_cov = train_X.T @ train_X
-        XY_cov = train_X.T @ train_Y
 
         for ite in range(iteration):
             # update form of approximated laplace prior
-            est_h_xi = est_mean**2 + np.diag(est_sigma)
+            est_h_xi = est_mean**2 + est_sigma_diag
             est_v_xi = -est_pri_beta / 2 / np.sqrt(est_h_xi)
 
             # update posterior distribution
-            inv_sigma = X_cov - 2 * np.diag(est_v_xi)
-            est_mean = np.linalg.solve(inv_sigma, XY_cov)
-            est_sigma = np.linalg.inv(inv_sigma)
+            moments = calc_moments(-2 * est_v_xi)
+            est_mean = moments["mean"]
+            est_sigma_diag = moments["sigma_diag"]
 
             # update pri_beta by extreme value
-            est_pri_beta = M / ((est_mean**2 + np.diag(est_sigma)) /
+            est_pri_beta = M / ((est_mean**2 + est_sigma_diag + est_h_xi) /
                                 (2 * np.sqrt(est_h_xi))).sum() if self.pri_opt_flag else pri_beta
 
+            # F is the bound at (q, h_xi, pri_beta) above, so v_xi follows the updated pri_beta.
             current_F = self._obj_func(
-                train_Y, est_pri_beta, est_mean, inv_sigma, est_h_xi, est_v_xi)
+                n, est_pri_beta, moments, est_h_xi, -est_pri_beta / 2 / np.sqrt(est_h_xi))
             if is_trace and ite % trace_step == 0:
                 print(current_F)
 
             if ite > 0 and np.abs(current_F - F[ite - 1]) < tol:
                 if is_trace:
-                    print(current_F, (dFdnu1**2).sum(), (dFdnu2**2).sum())
+                    print(current_F)
                 break
             else:
                 F.append(current_F)
@@ -482,12 +1049,37 @@ class VBApproxLaplace(BaseEstimator, RegressorMixin):
 
         self.F_ = F
         self.mean_ = est_mean
-        self.sigma_ = est_sigma
+        self.sigma_ = moments["sigma"]
+        self.sigma_diag_ = est_sigma_diag
         self.pri_beta_ = est_pri_beta
 
         return self
         pass
 
+    def fit_path(self, train_X: np.ndarray, train_Y: np.ndarray, pri_beta_list: list,
+                 chunk_size: int = 100000, n_jobs: int = 1):
+        """
+        Regularization path, see VBLaplace.fit_path, i.e. fits with pri_beta = pri_beta_list[0], pri_beta_list[1], ... in this order.
+        pri_beta is fixed in each fit (pri_opt_flag is not used), X^T X is computed once and shared,
+        and each fit is warm-started from the previous one.
+        This estimator itself is not changed.
+
+        + Input:
+            1. train_X: (n, M) array or np.memmap, X^T X is accumulated by chunk_size rows.
+            2. train_Y: (n, ) vector or (n, T) matrix of T independent targets.
+            3. pri_beta_list: sequence of pri_beta.
+            4. n_jobs: number of threads fitting the targets, -1 means the number of cpus.
+
+        + Output:
+            1. mean: (P, M) means for P = len(pri_beta_list), or (T, P, M) for the T targets.
+            2. sigma_diag: posterior variances of the same shape as mean.
+        """
+        diag = _check_covariance(self.covariance)
+        dual = not diag and _use_dual(self.solver, train_X.shape)
+        # The diagonal mode and the dual form work with the data itself when X^T X is larger than X.
+        use_gram = not dual and not (diag and train_X.shape[1] > train_X.shape[0])
+        return _fit_path(self, train_X, train_Y, pri_beta_list, use_gram, not (diag or dual), chunk_size, n_jobs)
+
     def predict(self, test_X: np.ndarray):
         if not hasattr(self, "mean_"):
             raise ValueError(
@@ -1,7 +1,7 @@
 __all__ = [
-    "GaussianMixtureModelVB",
-    "VBLaplace", "VBNormal", "VBApproxLaplace"
+    "GaussianMixtureModelVB", "MixturePredictor",
+    "VBLaplace", "VBNormal", "VBApproxLaplace", "LinearRegressionStats"
 ]
 
-from learning.MixtureModel import GaussianMixtureModelVB,
-from .VBLinearRegressor import VBLaplace, VBNormal, VBApproxLaplace
+from learning.MixtureModel import AbstractMixtureModel, GaussianMixtureModelVB, MixturePredictor
+from .VBLinearRegressor import VBLaplace, VBNormal, VBApproxLaplace, LinearRegressionStats
@@ -1,9 +1,12 @@
-__all__ = ["ratio_tanh_x", "logcosh", "multipsi",
+__all__ = ["ratio_tanh_x", "logcosh", "multipsi", "multigammaln",
             "GaussianMixtureModel", "rgmm",
             "HyperbolicSecantMixtureModel",
             "StudentMixtureModel",
             "LaplaceMixtureModel",
-            "GumbelMixtureModel"]
+            "NormalMixtureModel",
+            "GumbelMixtureModel",
+            "map_shared"]
 
 from util.elementary_function import *
 from util.prob import *
+from util.parallel import *
@@ -6,42 +6,108 @@ This module is a set of useful function, while famous library does not seem to c
 
 ## 3rd party libraries
 import numpy as np
-from scipy.special import psi
+from scipy.special import psi, gammaln
 
 ## local libraries
 
-def ratio_tanh_x(x):
+### Number of elements processed at once by the blocked kernels, so that the scratch buffer stays in the cache.
+_BLOCK_SIZE = 2**14
+_LOG2 = np.log(2)
+
+
+def _iter_blocks(x:np.ndarray, out:np.ndarray):
+    """
+    Iterate (x_block, out_block) over the flattened x and out, each block has _BLOCK_SIZE elements at most.
+    When out is not contiguous, the whole arrays are given as one block.
+    """
+    if not out.flags.c_contiguous:
+        yield (np.broadcast_to(x, out.shape), out)
+        return
+    flat_x = np.broadcast_to(x, out.shape).reshape(-1)
+    flat_out = out.reshape(-1)
+    for start in range(0, flat_out.size, _BLOCK_SIZE):
+        yield (flat_x[start:start+_BLOCK_SIZE], flat_out[start:start+_BLOCK_SIZE])
+
+def _prepare_out(x, out:np.ndarray):
+    """
+    Array x, output buffer and scratch buffer of the blocked kernels.
+    """
+    x = np.asarray(x)
+    if out is None:
+        out = np.empty(x.shape, dtype = np.result_type(x.dtype, np.float32))
+    scratch = np.empty(min(out.size, _BLOCK_SIZE) if out.flags.c_contiguous else out.shape, dtype = out.dtype)
+    return (x, out, scratch)
+
+def ratio_tanh_x(x, out:np.ndarray = None):
     """
     Calculating f(x)=tanh(x)/x.
     While lim_{x -> 0} f(x) = 1, overflow is occured at zero point.
     Thus, this function is conditioned by zero point and other points.
+    The value has the same precision as x, e.g. float32 for float32 x.
+
+    + Input:
+        1. x: array like.
+        2. out: buffer to store the value, it may be x itself. A new array is allocated if it is None.
+    Note: Since tanh(x) = x in floating point for |x| < 1e-8, only x = 0 needs the limit value.
+    The computation runs block by block with one scratch buffer, and no temporary of the size of x is allocated.
     """
-    zero_condition = 1e-20
-    ret_val = np.zeros(x.shape)
-    zero_ind = np.abs(x) < zero_condition
-    ret_val[~zero_ind] = np.tanh(x[~zero_ind])/x[~zero_ind]
-    ret_val[zero_ind] = 1
-    return ret_val
-
-def logcosh(x:np.ndarray):
+    (x, out, scratch) = _prepare_out(x, out)
+    for (x_block, out_block) in _iter_blocks(x, out):
+        block_scratch = scratch[:out_block.size].reshape(out_block.shape)
+        np.tanh(x_block, out = block_scratch)
+        is_zero = x_block == 0
+        np.divide(block_scratch, x_block, out = out_block, where = ~is_zero)
+        out_block[is_zero] = 1
+    return out if out.ndim > 0 else out[()]
+
+def logcosh(x:np.ndarray, out:np.ndarray = None):
     """
     Calculating a log cosh(x).
     When absolute value of x is very large, this function are overflow,
-    so we avoid it.
+    so we avoid it by log cosh(x) = |x| + log(1 + exp(-2|x|)) - log 2.
+
+    + Input:
+        1. x: array like.
+        2. out: buffer to store the value, it may be x itself. A new array is allocated if it is None.
+    Note: The computation runs block by block with one scratch buffer in the same manner as ratio_tanh_x.
     """
-    return np.abs(x) + np.log((1 + np.exp(-2 * np.abs(x)))/2)
+    (x, out, scratch) = _prepare_out(x, out)
+    for (x_block, out_block) in _iter_blocks(x, out):
+        block_scratch = scratch[:out_block.size].reshape(out_block.shape)
+        np.abs(x_block, out = block_scratch)
+        np.multiply(block_scratch, -2, out = out_block)
+        np.exp(out_block, out = out_block)
+        np.log1p(out_block, out = out_block)
+        out_block += block_scratch
+        out_block -= _LOG2
+    return out if out.ndim > 0 else out[()]
 
-def multipsi(x:float, d:int):
+def multipsi(x, d:int):
     """
     Calculate multivariate digamma function f(x,d):
     f(x,d) = sum_{j=1}^d psi(x + (1-j)/2)
     + Input
-        1. x: float value > d
+        1. x: float value or array of them, each > (d-1)/2
+        2. d: integer
+    + Output
+        f(x,d) with the same shape as x, all the elements are evaluated in one call.
+    """
+    return psi(np.asarray(x)[..., np.newaxis] - np.arange(d)/2).sum(axis = -1)
+
+def multigammaln(x, d:int):
+    """
+    Calculate logarithm of multivariate gamma function f(x,d):
+    f(x,d) = d(d-1)/4 log(pi) + sum_{j=1}^d log Gamma(x + (1-j)/2)
+    + Input
+        1. x: float value or array of them, each > (d-1)/2
         2. d: integer
     + Output
-        f(x,d)
+        f(x,d) with the same shape as x, all the elements are evaluated in one call.
     """
-    return (psi(x) + (1 - np.arange(1, d+1))/2).sum()
+    x = np.asarray(x)
+    if np.any(x <= (d - 1)/2):
+        raise ValueError(f"x must be larger than (d-1)/2 = {(d - 1)/2}.")
+    return d*(d - 1)/4*np.log(np.pi) + gammaln(x[..., np.newaxis] - np.arange(d)/2).sum(axis = -1)
 
 
 def rgmm(ratio:np.ndarray, mean:np.ndarray, precision:np.ndarray, size:int=1, data_seed:int = -1):
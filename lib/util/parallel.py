@@ -0,0 +1,66 @@
+"""
+This module is a set of functions to run independent tasks on a process pool.
+"""
+## standard libraries
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+## 3rd party libraries
+import numpy as np
+
+## local libraries
+
+### Read-only data attached to the worker process.
+_shared_data = dict()
+
+
+def _attach_memmap(filename:str, dtype:str, shape:tuple, offset:int, order:str):
+    """
+    Initializer of each worker, the data is opened as read-only memory map.
+    """
+    _shared_data["X"] = np.memmap(filename, dtype=dtype, mode="r", shape=shape, offset=offset, order=order)
+
+
+def _call_with_shared_data(func, arg):
+    return func(_shared_data["X"], arg)
+
+
+def map_shared(func, X:np.ndarray, args:list, n_jobs:int = 1) -> list:
+    """
+    Evaluate [func(X, arg) for arg in args] by a process pool.
+    X is not pickled to each worker, but shared by a read-only memory map.
+    When X is np.memmap, the file is used as it is, otherwise X is dumped to a temporary file once.
+
+    + Input:
+        1. func: picklable function, e.g. bound method of an estimator, called as func(X, arg).
+        2. X: array shared among the workers.
+        3. args: list of the second arguments of func.
+        4. n_jobs: number of processes, -1 means the number of cpus.
+            Note: when n_jobs is 1, func is evaluated in this process.
+
+    + Output:
+        list of the returned values in the order of args.
+    """
+    if n_jobs == 1 or len(args) <= 1:
+        return [func(X, arg) for arg in args]
+    n_jobs = os.cpu_count() if n_jobs < 0 else n_jobs
+
+    filename = None
+    if isinstance(X, np.memmap) and X.filename is not None and (X.flags.c_contiguous or X.flags.f_contiguous):
+        initargs = (X.filename, X.dtype.str, X.shape, X.offset, "C" if X.flags.c_contiguous else "F")
+    else:
+        (fd, filename) = tempfile.mkstemp(suffix=".dat")
+        os.close(fd)
+        shared_X = np.memmap(filename, dtype=X.dtype, mode="w+", shape=X.shape)
+        shared_X[...] = X
+        shared_X.flush()
+        del shared_X
+        initargs = (filename, X.dtype.str, X.shape, 0, "C")
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(args)), initializer=_attach_memmap, initargs=initargs) as executor:
+            return list(executor.map(_call_with_shared_data, [func]*len(args), args))
+    finally:
+        if filename is not None:
+            os.remove(filename)
@@ -3,11 +3,13 @@ This library is for probability distribution
 """
 
 # standard libraries
+import os
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 
 # 3rd party libraries
 import numpy as np
-from scipy.stats import multivariate_normal, t, laplace, gumbel_r, hypsecant
+from scipy.stats import multivariate_normal, norm, t, laplace, gumbel_r, hypsecant
 from util.elementary_function import logcosh
 
 
@@ -19,9 +21,10 @@ class AbstractMixtureModel(metaclass=ABCMeta):
     # def _rvs_component(cls, loc:float=0, scale:float=1, size:int =1, **kwargs):
     @classmethod
     @abstractmethod
-    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, **kwargs):
+    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, random_state: np.random.Generator = None, **kwargs):
         """
         Generate random variable for each component distribution.
+        loc and scale are broadcast to size, and random_state is passed to scipy.stats.
         """
         raise NotImplementedError()
 
@@ -34,49 +37,225 @@ class AbstractMixtureModel(metaclass=ABCMeta):
         raise NotImplementedError()
 
     @classmethod
-    def rvs(cls, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, size: int = 1, data_seed: int = -1, **kwargs):
-        if data_seed > 0:
-            np.random.seed(data_seed)
-        data_label = np.random.multinomial(n=1, pvals=ratio, size=size)
-        data_label_arg = np.argmax(data_label, axis=1)
-        X = np.array([[cls._rvs_component(loc[data_label_arg[i], j], scale[data_label_arg[i], j],
-                                          size=1, **kwargs) for j in range(loc.shape[1])] for i in range(size)]).squeeze()
-        return (X, data_label, data_label_arg)
+    def rvs(cls, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, size: int = 1, data_seed: int = -1,
+            random_state: np.random.Generator = None, **kwargs):
+        """
+        Generate data following the mixture.
+        All the labels are drawn at once, and then the data of each component are drawn by one vectorized call.
+
+        + Input:
+            1. ratio: K dimensional mixture ratio.
+            2. loc, scale: K * M parameters of the components.
+            3. size: number of data.
+            4. data_seed: when random_state is None and data_seed > 0, the global np.random state is seeded by data_seed
+               as before, so the following unseeded calls (e.g. the test data) are reproducible as well.
+            5. random_state: np.random.Generator to draw the data. When None, a np.random.RandomState seeded from the global
+               np.random state is used.
+
+        + Output:
+            1. X: size * M data, squeezed in the same manner as before.
+            2. data_label: size * K one-hot label.
+            3. data_label_arg: size label.
+
+        Since the draws are vectorized, the data for a given data_seed differ from those of the former element-wise rvs,
+        although they are still reproducible.
+        """
+        if random_state is None:
+            if data_seed > 0:
+                np.random.seed(data_seed)
+            random_state = np.random.RandomState(np.random.randint(np.iinfo(np.int32).max))
+        (X, data_label_arg) = cls._rvs_label_arg(
+            ratio, loc, scale, size, random_state, **kwargs)
+        data_label = np.eye(len(ratio), dtype=int)[data_label_arg]
+        return (X.squeeze(), data_label, data_label_arg.astype(int))
 
     @classmethod
-    def logpdf(cls, X: np.ndarray, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, **kwargs):
-        n = X.shape[0]
-        K = len(ratio)
-
-        loglik = np.zeros((n, K))
+    def _rvs_label_arg(cls, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, size: int, random_state: np.random.Generator, **kwargs):
+        """
+        size * M data and the label of each data, drawn by one vectorized call for each component.
+        The label has the smallest integer type for K components.
+        """
+        (K, M) = loc.shape
+        data_label_arg = random_state.choice(
+            K, size=size, p=ratio).astype(np.min_scalar_type(K - 1))
+        X = np.empty((size, M))
         for k in range(K):
-            if scale.ndim == 2:
-                loglik[:, k] = np.log(
-                    ratio[k]) + cls._logpdf_component(X, loc[k, :], scale[k, :], **kwargs).sum(axis=1)
-            elif scale.ndim == 3:
-                loglik[:, k] = np.log(
-                    ratio[k]) + cls._logpdf_component(X, loc[k, :],  scale[k, :, :], **kwargs).sum(axis=1)
-            else:
-                raise ValueError(
-                    "Error precision, dimension of precision must be 2 or 3!")
-        max_loglik = loglik.max(axis=1)
-        norm_loglik = loglik - np.repeat(max_loglik, K).reshape(n, K)
-        return (np.log(np.exp(norm_loglik).sum(axis=1)) + max_loglik).sum()
+            is_k = data_label_arg == k
+            X[is_k] = cls._rvs_component(
+                loc[k], scale[k], size=(is_k.sum(), M), random_state=random_state, **kwargs)
+        return (X, data_label_arg)
 
     @classmethod
-    def latent_posterior_logprob(cls, x: np.ndarray, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, **kwargs):
-        K = len(ratio)
-        (n, M) = x.shape
-        log_complete_likelihood = (np.repeat(np.log(ratio), n).reshape(K, n) + np.array(
-            [cls._logpdf_component(x, loc=loc[k, :], scale=scale[k, :], **kwargs).sum(axis=1) for k in range(K)])).T
-        max_log_complete_likelihood = log_complete_likelihood.max(axis=1)
-        norm_log_complete_likelihood = log_complete_likelihood - \
-            np.repeat(max_log_complete_likelihood, K).reshape(n, K)
-        log_posterior_p = norm_log_complete_likelihood - \
-            np.log(np.repeat(np.exp(norm_log_complete_likelihood).sum(
-                axis=1), K).reshape(n, K))
+    def rvs_chunk(cls, chunk_index: int, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, size: int, chunk_size: int,
+                  data_seed: int, **kwargs):
+        """
+        Generate the chunk_index-th chunk of size data, i.e. the rows chunk_index * chunk_size, ..., (chunk_index + 1) * chunk_size - 1.
+        The chunk is drawn by np.random.Generator of SeedSequence(data_seed, spawn_key=(chunk_index,)),
+        so each chunk is reproducible independently of the other chunks, and chunks can be generated in parallel.
+
+        + Output:
+            1. X: n_c * M data of the chunk.
+            2. data_label_arg: n_c label of the chunk.
+        """
+        random_state = np.random.default_rng(
+            np.random.SeedSequence(data_seed, spawn_key=(chunk_index,)))
+        n = min(chunk_size, size - chunk_index * chunk_size)
+        return cls._rvs_label_arg(ratio, loc, scale, n, random_state, **kwargs)
+
+    @classmethod
+    def rvs_chunks(cls, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, size: int, chunk_size: int = 100000,
+                   data_seed: int = -1, **kwargs):
+        """
+        Iterator of (X, data_label_arg) of the chunks of size data given by rvs_chunk.
+        Only one chunk is kept in memory.
+        """
+        if data_seed <= 0:
+            data_seed = np.random.SeedSequence().entropy
+        for chunk_index in range(-(-size // chunk_size)):
+            yield cls.rvs_chunk(chunk_index, ratio, loc, scale, size, chunk_size, data_seed, **kwargs)
+
+    @classmethod
+    def rvs_to_npy(cls, filename: str, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, size: int,
+                   chunk_size: int = 100000, data_seed: int = -1, label_filename: str = None, n_jobs: int = 1, **kwargs):
+        """
+        Write size data into the .npy file filename chunk by chunk, and the label into label_filename.
+        The values are the same as rvs_chunks with the same data_seed for any n_jobs.
+
+        + Input:
+            1. filename: .npy file of size * M float64 data.
+            2. label_filename: .npy file of the label, filename + "_label.npy" is used if it is None.
+            3. n_jobs: number of processes writing the chunks, -1 means the number of cpus.
+
+        + Output:
+            1. X: read-only np.memmap of the data.
+            2. data_label_arg: read-only np.memmap of the label.
+        """
+        if label_filename is None:
+            label_filename = os.path.splitext(filename)[0] + "_label.npy"
+        if data_seed <= 0:
+            data_seed = np.random.SeedSequence().entropy
+        np.lib.format.open_memmap(filename, mode="w+", dtype=np.float64, shape=(size, loc.shape[1]))
+        np.lib.format.open_memmap(label_filename, mode="w+", dtype=np.min_scalar_type(len(ratio) - 1), shape=(size,))
+
+        chunk_indices = range(-(-size // chunk_size))
+        args = (filename, label_filename, ratio, loc, scale, size, chunk_size, data_seed, kwargs)
+        if n_jobs == 1:
+            for chunk_index in chunk_indices:
+                cls._write_chunk(chunk_index, *args)
+        else:
+            n_jobs = os.cpu_count() if n_jobs < 0 else n_jobs
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                list(executor.map(cls._write_chunk, chunk_indices, *[[arg] * len(chunk_indices) for arg in args]))
+        return (np.load(filename, mmap_mode="r"), np.load(label_filename, mmap_mode="r"))
+
+    @classmethod
+    def _write_chunk(cls, chunk_index: int, filename: str, label_filename: str, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray,
+                     size: int, chunk_size: int, data_seed: int, kwargs: dict):
+        """
+        Write the chunk_index-th chunk of rvs_chunk into the .npy files made by rvs_to_npy.
+        """
+        (X, data_label_arg) = cls.rvs_chunk(chunk_index, ratio, loc, scale, size, chunk_size, data_seed, **kwargs)
+        start = chunk_index * chunk_size
+        out_X = np.load(filename, mmap_mode="r+")
+        out_X[start:start + len(X)] = X
+        out_X.flush()
+        out_label = np.load(label_filename, mmap_mode="r+")
+        out_label[start:start + len(X)] = data_label_arg
+        out_label.flush()
+
+    @classmethod
+    def logpdf(cls, X: np.ndarray, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, chunk_size: int = None, **kwargs):
+        """
+        Sum of log p(x_i|w) over the data, see logpdf_samples.
+        """
+        return cls.logpdf_samples(X, ratio, loc, scale, chunk_size=chunk_size, **kwargs).sum()
+
+    @classmethod
+    def logpdf_samples(cls, X: np.ndarray, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, chunk_size: int = None, **kwargs):
+        """
+        n vector of log p(x_i|w) = log sum_k a_k p(x_i|loc_k, scale_k).
+        All the K components are evaluated by one broadcasted call of _logpdf_component on n_c * K * M arrays,
+        where n_c is chunk_size (all the data if it is None).
+        """
+        n = X.shape[0]
+        chunk_size = _check_chunk_size(chunk_size, n)
+        log_p = np.empty(n)
+        for start in range(0, n, chunk_size):
+            log_p[start:start + chunk_size] = _calc_log_norm(cls._log_complete_likelihood(
+                X[start:start + chunk_size], ratio, loc, scale, **kwargs))
+        return log_p
+
+    @classmethod
+    def latent_posterior_logprob(cls, x: np.ndarray, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, chunk_size: int = None, **kwargs):
+        """
+        n * K matrix of log p(z_i = k|x_i, w), evaluated by chunks in the same manner as logpdf_samples.
+        """
+        n = x.shape[0]
+        chunk_size = _check_chunk_size(chunk_size, n)
+        log_posterior_p = np.empty((n, len(ratio)))
+        for start in range(0, n, chunk_size):
+            log_complete_likelihood = cls._log_complete_likelihood(
+                x[start:start + chunk_size], ratio, loc, scale, **kwargs)
+            log_posterior_p[start:start + chunk_size] = log_complete_likelihood - \
+                _calc_log_norm(log_complete_likelihood)[:, np.newaxis]
         return log_posterior_p
 
+    @classmethod
+    def _log_complete_likelihood(cls, X: np.ndarray, ratio: np.ndarray, loc: np.ndarray, scale: np.ndarray, **kwargs):
+        """
+        n * K matrix of log a_k + sum_j log p(x_ij|loc_kj, scale_kj).
+        A K * M * M scale is evaluated by each component as before.
+        """
+        if scale.ndim == 2:
+            return np.log(ratio) + cls._logpdf_component(X[:, np.newaxis, :], loc, scale, **kwargs).sum(axis=2)
+        elif scale.ndim == 3:
+            return np.log(ratio) + np.array([cls._logpdf_component(X, loc[k, :], scale[k, :, :], **kwargs).sum(axis=1)
+                                             for k in range(len(ratio))]).T
+        else:
+            raise ValueError(
+                "Error precision, dimension of precision must be 2 or 3!")
+
+
+def _calc_log_norm(log_complete_likelihood: np.ndarray) -> np.ndarray:
+    """
+    log sum_k exp(L_{ik}) of each row of n * K matrix L without overflow.
+    """
+    max_log_complete_likelihood = log_complete_likelihood.max(axis=1)
+    return np.log(np.exp(log_complete_likelihood - max_log_complete_likelihood[:, np.newaxis]).sum(axis=1)) + max_log_complete_likelihood
+
+
+def _check_chunk_size(chunk_size: int, n: int) -> int:
+    """
+    Number of rows evaluated at once, all the n rows if chunk_size is None.
+    """
+    if chunk_size is None:
+        return max(n, 1)
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer, got {}.".format(chunk_size))
+    return chunk_size
+
+
+class NormalMixtureModel(AbstractMixtureModel):
+    """
+    Mixture model for normal distribution with diagonal covariance, where scale is the standard deviation.
+    Data of GaussianMixtureModel.rvs(ratio, mean, precision) follows this model with loc=mean and scale=1/sqrt(precision),
+    so rvs_chunks and rvs_to_npy of this class stream the data of GaussianMixtureModel.
+    """
+
+    @classmethod
+    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, random_state: np.random.Generator = None, **kwargs):
+        """
+        Generate random variable for each component distribution.
+        """
+        return norm.rvs(loc=loc, scale=scale, size=size, random_state=random_state)
+
+    @classmethod
+    def _logpdf_component(cls, x: np.ndarray, loc: float = 0, scale: float = 1, **kwargs):
+        """
+        Calculate log probability density function.
+        """
+        return norm.logpdf(x, loc, scale)
+
 
 class GumbelMixtureModel(AbstractMixtureModel):
     """
@@ -85,11 +264,11 @@ class GumbelMixtureModel(AbstractMixtureModel):
     w = (a_k, b_k, s_k)_k^K
     """
     @classmethod
-    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, **kwargs):
+    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, random_state: np.random.Generator = None, **kwargs):
         """
         Generate random variable for each component distribution.
         """
-        return gumbel_r.rvs(loc=loc, scale=scale, size=size)
+        return gumbel_r.rvs(loc=loc, scale=scale, size=size, random_state=random_state)
 
     @classmethod
     def _logpdf_component(cls, x: np.ndarray, loc: float = 0, scale: float = 1, **kwargs):
@@ -101,7 +280,7 @@ class GumbelMixtureModel(AbstractMixtureModel):
 
 class HyperbolicSecantMixtureModel(AbstractMixtureModel):
     @classmethod
-    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, **kwargs):
+    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, random_state: np.random.Generator = None, **kwargs):
         """
         Generate data following hyperbolic secant distribution.
         Let $Y \sim standard_cauchy(x)$,
@@ -110,7 +289,7 @@ class HyperbolicSecantMixtureModel(AbstractMixtureModel):
         """
         # Y = np.random.standard_cauchy(size=size)
         # X = 2/np.sqrt(scale)*np.arcsinh(Y) + loc
-        return hypsecant.rvs(loc=loc, scale=scale, size=size)
+        return hypsecant.rvs(loc=loc, scale=scale, size=size, random_state=random_state)
 
     @classmethod
     def _logpdf_component(cls, x: np.ndarray, loc: float = 0, scale: float = 1, **kwargs):
@@ -131,13 +310,13 @@ class StudentMixtureModel(AbstractMixtureModel):
     DEFAULT_DF = 5
 
     @classmethod
-    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, **kwargs):
+    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, random_state: np.random.Generator = None, **kwargs):
         """
         Generate random variable for each component distribution.
         """
         df = kwargs["df"] if "df" in kwargs.keys(
         ) else StudentMixtureModel.DEFAULT_DF
-        return t.rvs(df=df, loc=loc, scale=scale, size=size)
+        return t.rvs(df=df, loc=loc, scale=scale, size=size, random_state=random_state)
 
     @classmethod
     def _logpdf_component(cls, x: np.ndarray, loc: float = 0, scale: float = 1, **kwargs):
@@ -156,11 +335,11 @@ class LaplaceMixtureModel(AbstractMixtureModel):
     """
 
     @classmethod
-    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, **kwargs):
+    def _rvs_component(cls, loc: float = 0, scale: float = 1, size: int = 1, random_state: np.random.Generator = None, **kwargs):
         """
         Generate random variable for each component distribution.
         """
-        return laplace.rvs(loc=loc, scale=scale, size=size)
+        return laplace.rvs(loc=loc, scale=scale, size=size, random_state=random_state)
 
     @classmethod
     def _logpdf_component(cls, x: np.ndarray, loc: float = 0, scale: float = 1, **kwargs):
@@ -488,39 +667,56 @@ class GaussianMixtureModel(object):
     #     return np.exp(self.logpdf(X, ratio, mean, precision))
 
     @classmethod
-    def logpdf(cls, X: np.ndarray, ratio: np.ndarray, mean: np.ndarray, precision: np.ndarray):
-        n = X.shape[0]
-        K = len(ratio)
-
-        loglik = np.zeros((n, K))
-        for k in range(K):
-            if precision.ndim == 2:
-                loglik[:, k] = np.log(
-                    ratio[k]) + multivariate_normal.logpdf(X, mean[k, :], np.diag(1 / precision[k, :]))
-            elif precision.ndim == 3:
-                loglik[:, k] = np.log(
-                    ratio[k]) + multivariate_normal.logpdf(X, mean[k, :],  1 / precision[k, :, :])
-            else:
-                raise ValueError(
-                    "Error precision, dimension of precision must be 2 or 3!")
-        max_loglik = loglik.max(axis=1)
-        norm_loglik = loglik - np.repeat(max_loglik, K).reshape(n, K)
-        return (np.log(np.exp(norm_loglik).sum(axis=1)) + max_loglik).sum()
+    def logpdf(cls, X: np.ndarray, ratio: np.ndarray, mean: np.ndarray, precision: np.ndarray, chunk_size: int = None):
+        """
+        Sum of log p(x_i|w) over the data, see logpdf_samples.
+        """
+        return cls.logpdf_samples(X, ratio, mean, precision, chunk_size=chunk_size).sum()
 
     @classmethod
-    def latent_posterior_logprob(cls, x: np.ndarray, ratio: np.ndarray, mean: np.ndarray, precision: np.ndarray):
-        K = len(ratio)
-        (n, M) = x.shape
-        expand_x = np.repeat(x, K).reshape(n, M, K).transpose((0, 2, 1))
+    def logpdf_samples(cls, X: np.ndarray, ratio: np.ndarray, mean: np.ndarray, precision: np.ndarray, chunk_size: int = None):
+        """
+        n vector of log p(x_i|w), evaluated by chunks of chunk_size rows (all the data if it is None).
+        Diagonal precision is evaluated for all the K components at once by GEMMs.
+        """
+        n = X.shape[0]
+        chunk_size = _check_chunk_size(chunk_size, n)
+        log_p = np.empty(n)
+        for start in range(0, n, chunk_size):
+            log_p[start:start + chunk_size] = _calc_log_norm(cls._log_complete_likelihood(
+                X[start:start + chunk_size], ratio, mean, precision))
+        return log_p
 
-        y = np.repeat(precision, n).reshape(K, M, n).transpose(
-            (2, 0, 1)) * (expand_x - np.repeat(mean, n).reshape(K, M, n).transpose((2, 0, 1)))**2
-        log_complete_likelihood = np.repeat(np.log(ratio) + np.log(precision).sum(
-            axis=1) / 2 - M / 2 * np.log(2 * np.pi), n).reshape(K, n).T - y.sum(axis=2) / 2
-        max_log_complete_likelihood = log_complete_likelihood.max(axis=1)
-        norm_log_complete_likelihood = log_complete_likelihood - \
-            np.repeat(max_log_complete_likelihood, K).reshape(n, K)
-        log_posterior_p = norm_log_complete_likelihood - \
-            np.log(np.repeat(np.exp(norm_log_complete_likelihood).sum(
-                axis=1), K).reshape(n, K))
+    @classmethod
+    def latent_posterior_logprob(cls, x: np.ndarray, ratio: np.ndarray, mean: np.ndarray, precision: np.ndarray, chunk_size: int = None):
+        """
+        n * K matrix of log p(z_i = k|x_i, w), evaluated by chunks in the same manner as logpdf_samples.
+        """
+        n = x.shape[0]
+        chunk_size = _check_chunk_size(chunk_size, n)
+        log_posterior_p = np.empty((n, len(ratio)))
+        for start in range(0, n, chunk_size):
+            log_complete_likelihood = cls._log_complete_likelihood(
+                x[start:start + chunk_size], ratio, mean, precision)
+            log_posterior_p[start:start + chunk_size] = log_complete_likelihood - \
+                _calc_log_norm(log_complete_likelihood)[:, np.newaxis]
         return log_posterior_p
+
+    @classmethod
+    def _log_complete_likelihood(cls, X: np.ndarray, ratio: np.ndarray, mean: np.ndarray, precision: np.ndarray):
+        """
+        n * K matrix of log a_k + log N(x_i|mean_k, precision_k^{-1}).
+        + Diagonal precision s_k: log a_k + sum_j (log s_kj - s_kj mean_kj^2) / 2 - M log(2 pi) / 2 - (x_i^2 cdot s_k) / 2 + x_i cdot (s_k mean_k)
+        + K * M * M precision is evaluated by each component as before.
+        """
+        M = X.shape[1]
+        if precision.ndim == 2:
+            const = np.log(ratio) + (np.log(precision) - precision *
+                                     mean**2).sum(axis=1) / 2 - M / 2 * np.log(2 * np.pi)
+            return const - (X**2) @ precision.T / 2 + X @ (precision * mean).T
+        elif precision.ndim == 3:
+            return np.log(ratio) + np.array([multivariate_normal.logpdf(X, mean[k, :], 1 / precision[k, :, :])
+                                             for k in range(len(ratio))]).T
+        else:
+            raise ValueError(
+                "Error precision, dimension of precision must be 2 or 3!")